@@ -15,19 +15,30 @@ import threading
 from pathlib import Path
 from tnfsd import TNFSDaemon
 
+# Example files, relative to the example root
+_EXAMPLE_FILES = {
+    "readme.txt": b"This is a test TNFS server\nWelcome to the example!",
+    "data.txt": b"Some sample data\nLine 2\nLine 3",
+    "documents/report.txt": b"This is a sample report\nWith multiple lines\nOf content",
+}
+
 def create_test_environment():
     """Create a test directory structure"""
     test_dir = Path("example_root")
     test_dir.mkdir(exist_ok=True)
     
-    # Create some test files
-    (test_dir / "readme.txt").write_text("This is a test TNFS server\nWelcome to the example!")
-    (test_dir / "data.txt").write_text("Some sample data\nLine 2\nLine 3")
-    
     # Create a subdirectory
-    subdir = test_dir / "documents"
-    subdir.mkdir(exist_ok=True)
-    (subdir / "report.txt").write_text("This is a sample report\nWith multiple lines\nOf content")
+    (test_dir / "documents").mkdir(exist_ok=True)
+    
+    # Create the test files, leaving unchanged ones untouched
+    for name, data in _EXAMPLE_FILES.items():
+        path = test_dir / name
+        try:
+            if path.stat().st_size == len(data) and path.read_bytes() == data:
+                continue
+        except FileNotFoundError:
+            pass
+        path.write_bytes(data)
     
     print(f"Created test environment in: {test_dir}")
     return test_dir
@@ -36,6 +47,8 @@ def run_daemon_example():
     """Run the TNFS daemon example"""
     print("=== TNFS Daemon Example ===\n")
     
+    stop = threading.Event()
+    
     # Create test environment
     test_dir = create_test_environment()
     
@@ -61,12 +74,12 @@ def run_daemon_example():
     print("\nPress Ctrl+C to stop the daemon")
     
     try:
-        # Keep the main thread alive
-        while True:
-            time.sleep(1)
+        # Park the main thread until interrupted
+        stop.wait()
     except KeyboardInterrupt:
         print("\nShutting down daemon...")
         daemon.running = False
+        stop.set()
 
 def show_client_example():
     """Show how to create a TNFS client"""
@@ -76,6 +89,18 @@ def show_client_example():
 import socket
 import struct
 
+MAXMSGSZ = 532
+
+# Compiled once instead of re-parsing the format string on every packet
+_HDR = struct.Struct('<HBB')
+_ENTRY = struct.Struct('<BIII')
+
+def parse_entry(view):
+    # Decode one directory entry: flags, size, mtime, ctime, name
+    flags, size, mtime, ctime = _ENTRY.unpack_from(view, 4)
+    name = str(view[4 + _ENTRY.size:], 'utf-8').split('\\x00')[0]
+    return flags, size, mtime, ctime, name
+
 class SimpleTNFSClient:
     def __init__(self, host='localhost', port=16385):
         self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
@@ -83,50 +108,83 @@ class SimpleTNFSClient:
         self.port = port
         self.sid = 0
         self.seqno = 0
+        self._sndbuf = bytearray(MAXMSGSZ)
+        self._rcvbuf = bytearray(2048)
+    
+    def send(self, cmd, data):
+        # Build the packet in place: header, then payload
+        size = _HDR.size + len(data)
+        _HDR.pack_into(self._sndbuf, 0, self.sid, self.seqno, cmd)
+        self._sndbuf[_HDR.size:size] = data
+        self.sock.sendto(memoryview(self._sndbuf)[:size], (self.host, self.port))
+        # The server resends its last reply when a seqno repeats
+        self.seqno = (self.seqno + 1) & 0xFF
     
     def mount(self):
         # TNFS_MOUNT command
-        data = b'/\\x00test\\x00test\\x00'
-        header = struct.pack('<HBB', self.sid, self.seqno, 0x00)
-        packet = header + data
-        self.sock.sendto(packet, (self.host, self.port))
+        self.send(0x00, b'/\\x00test\\x00test\\x00')
         
         # Get response
         response, _ = self.sock.recvfrom(1024)
-        self.sid = struct.unpack('<H', response[:2])[0]
+        self.sid = int.from_bytes(response[:2], 'little')
         print(f"Mounted with session ID: {self.sid}")
     
     def list_directory(self):
         # Open directory
-        data = b'\\x00'  # Root directory
-        header = struct.pack('<HBB', self.sid, self.seqno, 0x10)  # OPENDIR
-        packet = header + data
-        self.sock.sendto(packet, (self.host, self.port))
+        self.send(0x10, b'\\x00')  # OPENDIR, root directory
         
         response, _ = self.sock.recvfrom(1024)
         handle = response[4]
         
         # Read directory entries
         while True:
-            data = struct.pack('<B', handle)
-            header = struct.pack('<HBB', self.sid, self.seqno, 0x11)  # READDIR
-            packet = header + data
-            self.sock.sendto(packet, (self.host, self.port))
+            self.send(0x11, bytes((handle,)))  # READDIR
             
-            response, _ = self.sock.recvfrom(1024)
-            if len(response) < 17:  # End of directory
+            # Receive straight into the reusable buffer
+            nbytes, _, msg_flags, _ = self.sock.recvmsg_into([self._rcvbuf])
+            if msg_flags & socket.MSG_TRUNC:
+                raise IOError("READDIR reply truncated")
+            view = memoryview(self._rcvbuf)[:nbytes]
+            if len(view) < 17:  # End of directory
                 break
             
-            # Parse entry
-            flags, size, mtime, ctime = struct.unpack('<BIII', response[4:17])
-            name = response[17:].split(b'\\x00')[0].decode('utf-8')
+            flags, size, mtime, ctime, name = parse_entry(view)
             print(f"  {name} ({size} bytes)")
         
         # Close directory
-        data = struct.pack('<B', handle)
-        header = struct.pack('<HBB', self.sid, self.seqno, 0x12)  # CLOSEDIR
-        packet = header + data
-        self.sock.sendto(packet, (self.host, self.port))
+        self.send(0x12, bytes((handle,)))  # CLOSEDIR
+    
+    def list_directory_batched(self, path=b'/', per_request=0):
+        # OPENDIRX/READDIRX return many entries per round trip
+        # Request: diropts, sortopts, maxresults, pattern, path
+        self.send(0x17, b'\\x00\\x00\\x00\\x00\\x00' + path + b'\\x00')  # OPENDIRX
+        
+        response, _ = self.sock.recvfrom(1024)
+        # Reply header is sid, seqno, cmd, status; payload starts at 5
+        if response[4] != 0:
+            raise IOError(f"OPENDIRX failed with status {response[4]}")
+        handle = response[5]
+        
+        while True:
+            self.send(0x18, bytes((handle, per_request)))  # READDIRX
+            
+            nbytes, _, _, _ = self.sock.recvmsg_into([self._rcvbuf])
+            view = memoryview(self._rcvbuf)[:nbytes]
+            if view[4] != 0:
+                raise IOError(f"READDIRX failed with status {view[4]}")
+            count, dirstatus = view[5], view[6]
+            offset = 9  # skip count, status and directory position
+            for _ in range(count):
+                flags, size, mtime, ctime = _ENTRY.unpack_from(view, offset)
+                offset += _ENTRY.size
+                end = self._rcvbuf.index(0, offset, nbytes)
+                print(f"  {str(view[offset:end], 'utf-8')} ({size} bytes)")
+                offset = end + 1
+            if dirstatus & 0x01 or count == 0:  # TNFS_DIRSTATUS_EOF
+                break
+        
+        self.send(0x12, bytes((handle,)))  # CLOSEDIR
+        self.sock.recvfrom(1024)  # Don't leave the reply for the next request
     
     def close(self):
         self.sock.close()
@@ -3,21 +3,38 @@
 Test runner script for TNFS daemon
 """
 
+import io
+import os
 import sys
-import subprocess
 import argparse
+import contextlib
+import importlib.util
 from pathlib import Path
 
+import pytest
 
-def run_tests(test_type="all", coverage=True, verbose=False, markers=None):
+
+def run_tests(test_type="all", coverage=False, verbose=False, markers=None, jobs="auto"):
     """Run the test suite with specified options"""
     
-    # Base pytest command
-    cmd = ["python", "-m", "pytest"]
+    # Base pytest arguments
+    cmd = []
+    
+    # Shard tests across worker processes if pytest-xdist is available
+    if str(jobs) != "1":
+        if importlib.util.find_spec("xdist") is not None:
+            cmd.extend(["-n", str(jobs), "--dist=loadfile"])
+        else:
+            print("pytest-xdist not installed, running tests serially")
     
     # Add coverage if requested
     if coverage:
         cmd.extend(["--cov=tnfsd", "--cov-report=term-missing"])
+        if "-n" in cmd:
+            cmd.append("--cov-context=test")
+        # Use PEP 669 monitoring instead of sys.settrace where available
+        if sys.version_info >= (3, 12):
+            os.environ.setdefault("COVERAGE_CORE", "sysmon")
     
     # Add verbose output if requested
     if verbose:
@@ -45,24 +62,22 @@ def run_tests(test_type="all", coverage=True, verbose=False, markers=None):
     # Add test directory
     cmd.append("tests/")
     
-    print(f"Running tests with command: {' '.join(cmd)}")
+    print(f"Running tests with arguments: {' '.join(cmd)}")
     print("-" * 60)
     
-    try:
-        result = subprocess.run(cmd, check=True)
-        print("-" * 60)
+    returncode = pytest.main(cmd)
+    print("-" * 60)
+    if returncode == 0:
         print("All tests passed!")
         return True
-    except subprocess.CalledProcessError as e:
-        print("-" * 60)
-        print(f"Tests failed with exit code: {e.returncode}")
-        return False
+    print(f"Tests failed with exit code: {int(returncode)}")
+    return False
 
 
 def run_specific_test(test_file, test_function=None):
     """Run a specific test file or function"""
     
-    cmd = ["python", "-m", "pytest"]
+    cmd = []
     
     if test_function:
         cmd.append(f"tests/{test_file}::{test_function}")
@@ -72,35 +87,36 @@ def run_specific_test(test_file, test_function=None):
     print(f"Running specific test: {' '.join(cmd)}")
     print("-" * 60)
     
-    try:
-        result = subprocess.run(cmd, check=True)
-        print("-" * 60)
+    returncode = pytest.main(cmd)
+    print("-" * 60)
+    if returncode == 0:
         print("Test passed!")
         return True
-    except subprocess.CalledProcessError as e:
-        print("-" * 60)
-        print(f"Test failed with exit code: {e.returncode}")
-        return False
+    print(f"Test failed with exit code: {int(returncode)}")
+    return False
 
 
 def list_tests():
     """List all available tests"""
     
-    cmd = ["python", "-m", "pytest", "--collect-only", "-q", "tests/"]
+    cmd = ["--collect-only", "-q", "tests/"]
     
     print("Available tests:")
     print("-" * 60)
     
-    try:
-        result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-        lines = result.stdout.strip().split('\n')
-        
-        for line in lines:
-            if line.strip() and not line.startswith('='):
-                print(line)
-                
-    except subprocess.CalledProcessError as e:
-        print(f"Failed to list tests: {e}")
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        returncode = pytest.main(cmd)
+    
+    if returncode != 0:
+        print(f"Failed to list tests: exit code {int(returncode)}")
+        return
+    
+    lines = output.getvalue().strip().split('\n')
+    
+    for line in lines:
+        if line.strip() and not line.startswith('='):
+            print(line)
 
 
 def main():
@@ -109,8 +125,8 @@ def main():
     parser = argparse.ArgumentParser(description="Run TNFS daemon tests")
     parser.add_argument("--type", choices=["all", "unit", "integration", "windows", "linux"], 
                        default="all", help="Type of tests to run")
-    parser.add_argument("--no-coverage", action="store_true", 
-                       help="Disable coverage reporting")
+    parser.add_argument("--coverage", action="store_true", 
+                       help="Enable coverage reporting")
     parser.add_argument("--verbose", "-v", action="store_true", 
                        help="Verbose output")
     parser.add_argument("--markers", nargs="+", 
@@ -121,6 +137,8 @@ def main():
                        help="Run tests from specific file")
     parser.add_argument("--test-function", 
                        help="Run specific test function")
+    parser.add_argument("--jobs", "-j", default="auto",
+                       help="Number of parallel test workers, or 'auto' (default: auto)")
     
     args = parser.parse_args()
     
@@ -143,9 +161,10 @@ def main():
     # Run full test suite
     success = run_tests(
         test_type=args.type,
-        coverage=not args.no_coverage,
+        coverage=args.coverage,
         verbose=args.verbose,
-        markers=args.markers
+        markers=args.markers,
+        jobs=args.jobs
     )
     
     sys.exit(0 if success else 1)
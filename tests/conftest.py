@@ -4,55 +4,54 @@ Pytest configuration and common fixtures for TNFS daemon tests
 """
 
 import pytest
-import tempfile
 import shutil
 import os
 from pathlib import Path
 
 
 @pytest.fixture(scope="session")
-def test_root_dir():
+def test_root_dir(tmp_path_factory):
     """Create a test root directory for the entire test session"""
-    temp_dir = tempfile.mkdtemp(prefix="tnfs_test_")
-    yield temp_dir
-    shutil.rmtree(temp_dir, ignore_errors=True)
+    return str(tmp_path_factory.mktemp("tnfs_test_"))
 
 
 @pytest.fixture
-def temp_dir():
+def temp_dir(tmp_path):
     """Create a temporary directory for individual tests"""
-    temp_dir = tempfile.mkdtemp(prefix="tnfs_temp_")
-    yield temp_dir
-    shutil.rmtree(temp_dir, ignore_errors=True)
+    return str(tmp_path)
 
 
-@pytest.fixture
-def sample_files(temp_dir):
-    """Create sample files for testing"""
-    # Create some test files
-    test_file1 = Path(temp_dir) / "test1.txt"
-    test_file1.write_text("This is test file 1\n" * 100)  # ~2000 bytes
+@pytest.fixture(scope="session")
+def _sample_files_template(test_root_dir):
+    """Write the sample file tree once per test session"""
+    template = Path(test_root_dir) / "template"
+    template.mkdir()
     
-    test_file2 = Path(temp_dir) / "test2.txt"
-    test_file2.write_text("This is test file 2\n" * 50)   # ~1000 bytes
+    # Create some test files
+    (template / "test1.txt").write_text("This is test file 1\n" * 100)  # ~2000 bytes
+    (template / "test2.txt").write_text("This is test file 2\n" * 50)   # ~1000 bytes
     
     # Create a subdirectory
-    subdir = Path(temp_dir) / "subdir"
-    subdir.mkdir()
-    
-    test_file3 = Path(temp_dir) / "subdir" / "test3.txt"
-    test_file3.write_text("This is test file 3\n" * 25)   # ~500 bytes
+    (template / "subdir").mkdir()
+    (template / "subdir" / "test3.txt").write_text("This is test file 3\n" * 25)   # ~500 bytes
     
     # Create a binary file for testing binary mode
-    binary_file = Path(temp_dir) / "binary.dat"
-    binary_file.write_bytes(b'\x00\x01\x02\x03' * 128)  # 512 bytes
+    (template / "binary.dat").write_bytes(b'\x00\x01\x02\x03' * 128)  # 512 bytes
+    
+    return template
+
+
+@pytest.fixture
+def sample_files(temp_dir, _sample_files_template):
+    """Create sample files for testing (copied from the session template)"""
+    shutil.copytree(_sample_files_template, temp_dir, dirs_exist_ok=True)
     
     return {
-        'test1.txt': test_file1,
-        'test2.txt': test_file2,
-        'subdir/test3.txt': test_file3,
-        'binary.dat': binary_file,
-        'subdir': subdir
+        'test1.txt': Path(temp_dir) / "test1.txt",
+        'test2.txt': Path(temp_dir) / "test2.txt",
+        'subdir/test3.txt': Path(temp_dir) / "subdir" / "test3.txt",
+        'binary.dat': Path(temp_dir) / "binary.dat",
+        'subdir': Path(temp_dir) / "subdir"
     }
 
 
@@ -68,6 +67,24 @@ def mock_socket():
     return mock_sock
 
 
+@pytest.fixture
+def sent_replies(daemon):
+    """Collect copies of every datagram the daemon sends (its transmit buffers are reused)"""
+    from unittest.mock import Mock
+    replies = []
+    daemon.udp_socket = Mock()
+    daemon.udp_socket.sendto.side_effect = lambda data, addr: replies.append(bytes(data))
+    return replies
+
+
+@pytest.fixture
+def session(daemon, temp_root_dir):
+    """Create session 1234 on the daemon, rooted at the daemon's root"""
+    from tnfsd import Session
+    session = Session(sid=1234, ipaddr=0x7F000001, port=16384, root=temp_root_dir)
+    daemon.sessions[1234] = session
+    return session
+
 def pytest_configure(config):
     """Configure pytest with custom markers"""
     config.addinivalue_line(
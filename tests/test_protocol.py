@@ -9,59 +9,106 @@ from tnfsd import (
 )
 
 
+EXPECTED_CLASSES = {
+    'SESSION': 0x00,
+    'DIRECTORY': 0x10,
+    'FILE': 0x20,
+}
+
+EXPECTED_COMMANDS = {
+    # Session commands
+    'MOUNT': 0x00,
+    'UMOUNT': 0x01,
+    # Directory commands
+    'OPENDIR': 0x10,
+    'READDIR': 0x11,
+    'CLOSEDIR': 0x12,
+    'MKDIR': 0x13,
+    'RMDIR': 0x14,
+    'TELLDIR': 0x15,
+    'SEEKDIR': 0x16,
+    'OPENDIRX': 0x17,
+    'READDIRX': 0x18,
+    # File commands
+    'OPENFILE_OLD': 0x20,
+    'READBLOCK': 0x21,
+    'WRITEBLOCK': 0x22,
+    'CLOSEFILE': 0x23,
+    'STATFILE': 0x24,
+    'SEEKFILE': 0x25,
+    'UNLINKFILE': 0x26,
+    'CHMODFILE': 0x27,
+    'RENAMEFILE': 0x28,
+    'OPENFILE': 0x29,
+}
+
+EXPECTED_ERRORS = {
+    'SUCCESS': 0x00,
+    'EPERM': 0x01,
+    'ENOENT': 0x02,
+    'EIO': 0x03,
+    'ENXIO': 0x04,
+    'E2BIG': 0x05,
+    'EBADF': 0x06,
+    'EAGAIN': 0x07,
+    'ENOMEM': 0x08,
+    'EACCES': 0x09,
+    'EBUSY': 0x0A,
+    'EEXIST': 0x0B,
+    'ENOTDIR': 0x0C,
+    'EISDIR': 0x0D,
+    'EINVAL': 0x0E,
+    'ENFILE': 0x0F,
+    'EMFILE': 0x10,
+    'EFBIG': 0x11,
+    'ENOSPC': 0x12,
+    'ESPIPE': 0x13,
+    'EROFS': 0x14,
+    'ENAMETOOLONG': 0x15,
+    'ENOSYS': 0x16,
+    'ENOTEMPTY': 0x17,
+    'ELOOP': 0x18,
+    'ENODATA': 0x19,
+    'ENOSTR': 0x1A,
+    'EPROTO': 0x1B,
+    'EBADFD': 0x1C,
+    'EUSERS': 0x1D,
+    'ENOBUFS': 0x1E,
+    'EALREADY': 0x1F,
+    'ESTALE': 0x20,
+    'EOF': 0x21,
+}
+
+EXPECTED_DIRENTRY_FLAGS = {
+    'DIR': 0x01,
+    'HIDDEN': 0x02,
+    'SPECIAL': 0x04,
+}
+
+
+def enum_table(enum_cls):
+    """Map member names to plain int values"""
+    return {name: member.value for name, member in enum_cls.__members__.items()}
+
+
 class TestProtocolConstants:
     """Test TNFS protocol constants"""
     
     def test_command_classes(self):
         """Test command class constants"""
-        assert CLASS.SESSION == 0x00
-        assert CLASS.DIRECTORY == 0x10
-        assert CLASS.FILE == 0x20
+        assert enum_table(CLASS) == EXPECTED_CLASSES
     
-    def test_session_commands(self):
-        """Test session command constants"""
-        assert TNFS_CMD.MOUNT == 0x00
-        assert TNFS_CMD.UMOUNT == 0x01
-    
-    def test_directory_commands(self):
-        """Test directory command constants"""
-        assert TNFS_CMD.OPENDIR == 0x10
-        assert TNFS_CMD.READDIR == 0x11
-        assert TNFS_CMD.CLOSEDIR == 0x12
-        assert TNFS_CMD.MKDIR == 0x13
-        assert TNFS_CMD.RMDIR == 0x14
-        assert TNFS_CMD.TELLDIR == 0x15
-        assert TNFS_CMD.SEEKDIR == 0x16
-        assert TNFS_CMD.OPENDIRX == 0x17
-        assert TNFS_CMD.READDIRX == 0x18
-    
-    def test_file_commands(self):
-        """Test file command constants"""
-        assert TNFS_CMD.OPENFILE_OLD == 0x20
-        assert TNFS_CMD.READBLOCK == 0x21
-        assert TNFS_CMD.WRITEBLOCK == 0x22
-        assert TNFS_CMD.CLOSEFILE == 0x23
-        assert TNFS_CMD.STATFILE == 0x24
-        assert TNFS_CMD.SEEKFILE == 0x25
-        assert TNFS_CMD.UNLINKFILE == 0x26
-        assert TNFS_CMD.CHMODFILE == 0x27
-        assert TNFS_CMD.RENAMEFILE == 0x28
-        assert TNFS_CMD.OPENFILE == 0x29
+    def test_commands(self):
+        """Test session, directory and file command constants"""
+        assert enum_table(TNFS_CMD) == EXPECTED_COMMANDS
     
     def test_error_codes(self):
         """Test error code constants"""
-        assert TNFS_ERROR.SUCCESS == 0x00
-        assert TNFS_ERROR.ENOENT == 0x02
-        assert TNFS_ERROR.EBADF == 0x06
-        assert TNFS_ERROR.EACCES == 0x09
-        assert TNFS_ERROR.EMFILE == 0x10
-        assert TNFS_ERROR.EOF == 0x21
+        assert enum_table(TNFS_ERROR) == EXPECTED_ERRORS
     
     def test_directory_entry_flags(self):
         """Test directory entry flag constants"""
-        assert DIRENTRY_FLAGS.DIR == 0x01
-        assert DIRENTRY_FLAGS.HIDDEN == 0x02
-        assert DIRENTRY_FLAGS.SPECIAL == 0x04
+        assert enum_table(DIRENTRY_FLAGS) == EXPECTED_DIRENTRY_FLAGS
     
     def test_size_constants(self):
         """Test size-related constants"""
@@ -80,8 +127,9 @@ class TestCommandClassification:
             TNFS_CMD.UMOUNT
         ]
         
-        for cmd in session_commands:
-            assert (cmd & 0xF0) == CLASS.SESSION
+        # Plain ints so the masking skips enum dispatch
+        cmds = [cmd.value for cmd in session_commands]
+        assert {cmd & 0xF0 for cmd in cmds} == {CLASS.SESSION.value}
     
     def test_directory_command_classification(self):
         """Test that directory commands are properly classified"""
@@ -97,8 +145,9 @@ class TestCommandClassification:
             TNFS_CMD.READDIRX
         ]
         
-        for cmd in directory_commands:
-            assert (cmd & 0xF0) == CLASS.DIRECTORY
+        # Plain ints so the masking skips enum dispatch
+        cmds = [cmd.value for cmd in directory_commands]
+        assert {cmd & 0xF0 for cmd in cmds} == {CLASS.DIRECTORY.value}
     
     def test_file_command_classification(self):
         """Test that file commands are properly classified"""
@@ -115,8 +164,9 @@ class TestCommandClassification:
             TNFS_CMD.OPENFILE
         ]
         
-        for cmd in file_commands:
-            assert (cmd & 0xF0) == CLASS.FILE
+        # Plain ints so the masking skips enum dispatch
+        cmds = [cmd.value for cmd in file_commands]
+        assert {cmd & 0xF0 for cmd in cmds} == {CLASS.FILE.value}
 
 
 class TestErrorHandling:
@@ -145,10 +195,9 @@ class TestErrorHandling:
     
     def test_error_code_ranges(self):
         """Test that error codes are within valid ranges"""
-        for error_code in TNFS_ERROR:
-            # Error codes should be positive integers
-            assert error_code >= 0
-            assert error_code <= 0xFF  # 8-bit range
+        # Error codes should be positive integers in the 8-bit range
+        assert min(TNFS_ERROR) >= 0
+        assert max(TNFS_ERROR) <= 0xFF
 
 
 class TestProtocolCompatibility:
@@ -11,10 +11,12 @@ import struct
 from pathlib import Path
 from unittest.mock import Mock
 
+import tnfsd
+
 # Import the modules to test
 from tnfsd import (
     TNFSDaemon, TNFSHeader, Session, DirectoryHandle,
-    TNFS_CMD, TNFS_ERROR, DIRENTRY_FLAGS
+    TNFS_CMD, TNFS_ERROR, DIRENTRY_FLAGS, DIR_CACHE_SIZE, DIR_CACHE_TTL, _scan_dir
 )
 
 
@@ -82,7 +84,7 @@ class TestSession:
         session = Session(sid=1234, ipaddr='127.0.0.1', port=16384, root='/dummy')
         
         # All FDs should be None initially
-        assert all(fd is None for fd in session.fd)
+        assert set(session.fd) == {None}
         
         # Get first free FD
         fd_index = session.get_free_fd()
@@ -112,7 +114,7 @@ class TestSession:
         session = Session(sid=1234, ipaddr='127.0.0.1', port=16384, root='/dummy')
         
         # All DHNDs should be None initially
-        assert all(dhnd is None for dhnd in session.dhandles)
+        assert set(session.dhandles) == {None}
         
         # Get first free DHND
         dhnd_index = session.get_free_dhandle()
@@ -124,6 +126,62 @@ class TestSession:
         # Get next free DHND
         dhnd_index = session.get_free_dhandle()
         assert dhnd_index == 1
+    
+    def test_release_fd_reuses_slot(self):
+        """Test that a released FD slot is handed out again"""
+        session = Session(sid=1234, ipaddr='127.0.0.1', port=16384, root='/dummy')
+        
+        for i in range(3):
+            session.fd[session.get_free_fd()] = i + 100
+        
+        # Release the middle slot and get it back
+        session.release_fd(1)
+        assert session.fd[1] is None
+        assert session.get_free_fd() == 1
+    
+    def test_find_fd_slot(self):
+        """Test looking up the slot of an open file descriptor"""
+        session = Session(sid=1234, ipaddr='127.0.0.1', port=16384, root='/dummy')
+        
+        fd_index = session.get_free_fd()
+        session.assign_fd(fd_index, 123)
+        assert session.find_fd_slot(123) == fd_index
+        
+        # Released descriptors are no longer found
+        session.release_fd(fd_index)
+        assert session.find_fd_slot(123) is None
+    
+    def test_fd_by_path(self):
+        """Test tracking open descriptors by path"""
+        session = Session(sid=1234, ipaddr='127.0.0.1', port=16384, root='/dummy')
+        
+        session.assign_fd(session.get_free_fd(), 123, os.path.join('root', 'a.txt'))
+        fd_index = session.get_free_fd()
+        session.assign_fd(fd_index, 124, os.path.join('root', 'b.txt'))
+        assert session.fd_by_path[os.path.join('root', 'a.txt')] == 123
+        
+        # Closing drops the path, forgetting a parent drops its children
+        session.release_fd(fd_index)
+        assert os.path.join('root', 'b.txt') not in session.fd_by_path
+        session.forget_path('root')
+        assert session.fd_by_path == {}
+    
+    def test_cleanup_closes_descriptors(self, tmp_path):
+        """Test that cleanup closes open files and frees all slots"""
+        session = Session(sid=1234, ipaddr='127.0.0.1', port=16384, root='/dummy')
+        
+        test_file = tmp_path / "test.txt"
+        test_file.write_text("test content")
+        fd = os.open(str(test_file), os.O_RDONLY)
+        session.assign_fd(session.get_free_fd(), fd, str(test_file))
+        
+        session.cleanup()
+        
+        with pytest.raises(OSError):
+            os.fstat(fd)
+        assert set(session.fd) == {None}
+        assert session.fd_by_path == {}
+        assert session.get_free_fd() == 0
 
 
 # FileHandle class not implemented in main code
@@ -155,13 +213,13 @@ class TestDirectoryHandle:
             # First read should return "."
             entry = dhnd.read_entry()
             assert entry is not None
-            assert entry.entrypath == "."
+            assert entry.entrypath == b"."
             assert entry.flags & DIRENTRY_FLAGS.DIR
             
             # Second read should return ".."
             entry = dhnd.read_entry()
             assert entry is not None
-            assert entry.entrypath == ".."
+            assert entry.entrypath == b".."
             assert entry.flags & DIRENTRY_FLAGS.DIR
     
     def test_directory_handle_read_entry_actual_files(self):
@@ -183,7 +241,7 @@ class TestDirectoryHandle:
             # Read actual file entry
             entry = dhnd.read_entry()
             assert entry is not None
-            assert entry.entrypath == "test.txt"
+            assert entry.entrypath == b"test.txt"
             assert not (entry.flags & DIRENTRY_FLAGS.DIR)  # Should be a file
     
     def test_directory_handle_read_entry_end(self):
@@ -201,6 +259,26 @@ class TestDirectoryHandle:
             # No more entries should be available
             entry = dhnd.read_entry()
             assert entry is None
+    
+    def test_directory_handle_read_entry_packed(self):
+        """Test reading a pre-packed directory entry"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            test_file = Path(tmp_dir) / "test.txt"
+            test_file.write_text("test content")
+            
+            dhnd = DirectoryHandle(tmp_dir)
+            assert dhnd.open()
+            
+            # Skip . and .. entries
+            dhnd.read_entry_packed()  # .
+            dhnd.read_entry_packed()  # ..
+            
+            # Fixed fields are followed by the null-terminated name
+            record = dhnd.read_entry_packed()
+            flags, size, mtime, ctime = struct.unpack('<BIII', record[:13])
+            assert flags == 0
+            assert size == len("test content")
+            assert record[13:] == b"test.txt\x00"
 
 
 class TestTNFSDaemon:
@@ -227,6 +305,78 @@ class TestTNFSDaemon:
         assert daemon.sessions == {}
         assert daemon.udp_socket is None
     
+    def test_resolve_path(self, daemon, temp_root_dir):
+        """Test mapping client paths under the root directory"""
+        root = str(Path(temp_root_dir).resolve())
+        
+        assert daemon.resolve_path(b'/') == os.fsencode(root)
+        assert daemon.resolve_path(b'/docs/readme.txt') == os.fsencode(os.path.join(root, 'docs', 'readme.txt'))
+        assert daemon.resolve_path(b'docs//./readme.txt') == os.fsencode(os.path.join(root, 'docs', 'readme.txt'))
+    
+    def test_resolve_path_outside_root(self, daemon):
+        """Test that paths escaping the root are rejected"""
+        with pytest.raises(PermissionError):
+            daemon.resolve_path(b'../etc/passwd')
+        with pytest.raises(PermissionError):
+            daemon.resolve_path(b'/docs/../../etc/passwd')
+    
+    def test_cleanup_expired_sessions(self, daemon, temp_root_dir):
+        """Test that only sessions idle past the timeout are removed"""
+        idle = daemon.create_session(0x7F000001, 16384, temp_root_dir)
+        active = daemon.create_session(0x7F000002, 16384, temp_root_dir)
+        
+        # Both deadlines have passed, but one client was heard from since
+        daemon._expiry_heap = [(0, idle.sid), (0, active.sid)]
+        idle.last_contact = 0
+        
+        daemon.cleanup_expired_sessions()
+        
+        assert idle.sid not in daemon.sessions
+        assert daemon.sessions[active.sid] is active
+        assert [sid for _, sid in daemon._expiry_heap] == [active.sid]
+    
+    def test_dir_cache_lru(self, daemon):
+        """Test the shared directory snapshot cache"""
+        daemon.cache_dir(b'/a', 1, [b'a'])
+        assert daemon.get_cached_dir(b'/a', 1) == [b'a']
+        
+        # A changed validity key is a miss
+        assert daemon.get_cached_dir(b'/a', 2) is None
+        
+        # Oldest entries are evicted once the cache is full
+        for i in range(DIR_CACHE_SIZE):
+            daemon.cache_dir(b'/d%d' % i, 1, [])
+        assert daemon.get_cached_dir(b'/a', 1) is None
+        assert daemon.get_cached_dir(b'/d0', 1) == []
+    
+    def test_opendirx_sees_outside_file_changes(self, daemon, temp_root_dir, monkeypatch, session, sent_replies):
+        """Test that a cached listing expires and picks up an external append"""
+        test_file = Path(temp_root_dir) / "f.txt"
+        test_file.write_bytes(b"abc")
+        
+        now = [1000.0]
+        monkeypatch.setattr(tnfsd, '_monotonic', lambda: now[0])
+        
+        def listed_size():
+            header = TNFSHeader(sid=1234, seqno=len(sent_replies), cmd=TNFS_CMD.OPENDIRX, status=0)
+            daemon.handle_opendirx(header, session, b'\x00\x00\x00\x00\x00/\x00')
+            handle_index = sent_replies[-1][5]
+            header = TNFSHeader(sid=1234, seqno=len(sent_replies), cmd=TNFS_CMD.READDIRX, status=0)
+            daemon.handle_readdirx(header, session, bytes((handle_index, 0)))
+            size = struct.unpack_from('<I', sent_replies[-1], 10)[0]
+            session.release_dhandle(handle_index)
+            return size
+        
+        assert listed_size() == 3
+        
+        # Appending does not touch the directory mtime or the daemon's
+        # generation, only the snapshot's age invalidates it
+        with open(test_file, "ab") as f:
+            f.write(b"x" * 1000)
+        now[0] += DIR_CACHE_TTL + 0.1
+        
+        assert listed_size() == 1003
+    
     def test_handle_mount_success(self, daemon):
         """Test successful mount"""
         # Create test data
@@ -307,7 +457,19 @@ class TestTNFSDaemon:
         daemon.handle_opendir(header, session, data)
         
         # Should create a directory handle
-        assert any(dhnd is not None for dhnd in session.dhandles)
+        assert set(session.dhandles) != {None}
+    
+    def test_handle_opendir_not_a_directory(self, daemon, temp_root_dir, session, sent_replies):
+        """Test opening a regular file as a directory"""
+        (Path(temp_root_dir) / "test.txt").write_text("test content")
+        
+        header = TNFSHeader(sid=1234, seqno=1, cmd=TNFS_CMD.OPENDIR, 
+                           status=0, ipaddr=0x7F000001, port=16384)
+        
+        daemon.handle_opendir(header, session, b'test.txt\x00')
+        
+        assert sent_replies[0][4] == TNFS_ERROR.ENOTDIR
+        assert set(session.dhandles) == {None}
     
     def test_handle_readdir_success(self, daemon, temp_root_dir):
         """Test successful directory read"""
@@ -362,7 +524,7 @@ class TestTNFSDaemon:
         daemon.handle_openfile(header, session, data)
         
         # Should create a file handle
-        assert any(fd is not None for fd in session.fd)
+        assert set(session.fd) != {None}
         
         # Clean up any open file descriptors to prevent cleanup issues
         for fd in session.fd:
@@ -371,7 +533,52 @@ class TestTNFSDaemon:
                     os.close(fd)
                 except (OSError, ValueError):
                     pass  # File already closed or invalid
-                session.fd[session.fd.index(fd)] = None
+                session.release_fd(session.find_fd_slot(fd))
+    
+    def test_handle_seekfile_then_read_and_append(self, daemon, temp_root_dir, session, sent_replies):
+        """Test that seeks move reads and that append writes land at the end"""
+        test_file = Path(temp_root_dir) / "test.txt"
+        test_file.write_bytes(b"0123456789")
+        
+        def request(cmd, data):
+            header = TNFSHeader(sid=1234, seqno=len(sent_replies), cmd=cmd, status=0)
+            daemon._DISPATCH[cmd](daemon, header, session, data)
+            assert sent_replies[-1][4] == TNFS_ERROR.SUCCESS
+            return sent_replies[-1][5:]
+        
+        # Read/write: seek from the end, then read what is left
+        fd_index = request(TNFS_CMD.OPENFILE, struct.pack('<HH', 0x0003, 0o644) + b'test.txt\x00')[0]
+        assert request(TNFS_CMD.SEEKFILE, struct.pack('<BBI', fd_index, 0x02, 0)) == struct.pack('<I', 10)
+        request(TNFS_CMD.SEEKFILE, struct.pack('<BBI', fd_index, 0x00, 6))
+        assert request(TNFS_CMD.READBLOCK, struct.pack('<BH', fd_index, 16))[2:] == b"6789"
+        request(TNFS_CMD.CLOSEFILE, bytes((fd_index,)))
+        
+        # Write/append
+        fd_index = request(TNFS_CMD.OPENFILE, struct.pack('<HH', 0x000A, 0o644) + b'test.txt\x00')[0]
+        request(TNFS_CMD.WRITEBLOCK, struct.pack('<BH', fd_index, 2) + b"ab")
+        request(TNFS_CMD.WRITEBLOCK, struct.pack('<BH', fd_index, 2) + b"cd")
+        request(TNFS_CMD.CLOSEFILE, bytes((fd_index,)))
+        
+        assert test_file.read_bytes() == b"0123456789abcd"
+    
+    @pytest.mark.skipif(not hasattr(os, 'mkfifo'), reason="FIFOs not available")
+    def test_handle_writeblock_readblock_fifo(self, daemon, temp_root_dir, session, sent_replies):
+        """Test that files without offsets are written and read in order"""
+        os.mkfifo(os.path.join(temp_root_dir, "pipe"))
+        
+        def request(cmd, data):
+            header = TNFSHeader(sid=1234, seqno=len(sent_replies), cmd=cmd, status=0)
+            daemon._DISPATCH[cmd](daemon, header, session, data)
+            assert sent_replies[-1][4] == TNFS_ERROR.SUCCESS
+            return sent_replies[-1][5:]
+        
+        # Read/write, so opening the FIFO does not wait for the other end
+        fd_index = request(TNFS_CMD.OPENFILE, struct.pack('<HH', 0x0003, 0o644) + b'pipe\x00')[0]
+        request(TNFS_CMD.WRITEBLOCK, struct.pack('<BH', fd_index, 3) + b"abc")
+        request(TNFS_CMD.WRITEBLOCK, struct.pack('<BH', fd_index, 3) + b"def")
+        assert request(TNFS_CMD.READBLOCK, struct.pack('<BH', fd_index, 4))[2:] == b"abcd"
+        assert request(TNFS_CMD.READBLOCK, struct.pack('<BH', fd_index, 4))[2:] == b"ef"
+        request(TNFS_CMD.CLOSEFILE, bytes((fd_index,)))
     
     def test_handle_readblock_success(self, daemon, temp_root_dir):
         """Test successful file read"""
@@ -406,6 +613,88 @@ class TestTNFSDaemon:
         # Cleanup
         os.close(fd)
     
+    def test_handle_readblock_reply_payload(self, daemon, temp_root_dir, session, sent_replies):
+        """Test that the READBLOCK reply carries the length and file data"""
+        test_file = Path(temp_root_dir) / "test.txt"
+        test_file.write_bytes(b"0123456789")
+        
+        fd_index = session.get_free_fd()
+        fd = os.open(str(test_file), os.O_RDONLY)
+        session.fd[fd_index] = fd
+        
+        header = TNFSHeader(sid=1234, seqno=1, cmd=TNFS_CMD.READBLOCK, 
+                           status=0, ipaddr=0x7F000001, port=16384)
+        
+        # Short read at end of file
+        daemon.handle_readblock(header, session, struct.pack('<BH', fd_index, 512))
+        
+        assert sent_replies[0][4] == TNFS_ERROR.SUCCESS
+        assert sent_replies[0][5:] == struct.pack('<H', 10) + b"0123456789"
+        
+        os.close(fd)
+    
+    def test_handle_packet_retransmits_duplicate(self, daemon, temp_root_dir, session, sent_replies):
+        """Test that a repeated seqno resends the last reply without re-reading"""
+        test_file = Path(temp_root_dir) / "test.txt"
+        test_file.write_bytes(b"0123456789")
+        
+        fd_index = session.get_free_fd()
+        fd = os.open(str(test_file), os.O_RDONLY)
+        session.fd[fd_index] = fd
+        
+        packet = struct.pack('<HBB', 1234, 7, TNFS_CMD.READBLOCK) + struct.pack('<BH', fd_index, 4)
+        daemon.handle_packet(packet, ('127.0.0.1', 16384))
+        daemon.handle_packet(packet, ('127.0.0.1', 16384))
+        
+        # Same reply twice, and the file position only advanced once
+        packet = struct.pack('<HBB', 1234, 8, TNFS_CMD.READBLOCK) + struct.pack('<BH', fd_index, 4)
+        daemon.handle_packet(packet, ('127.0.0.1', 16384))
+        
+        assert len(sent_replies) == 3
+        assert sent_replies[0] == sent_replies[1]
+        assert sent_replies[0][7:] == b"0123"
+        assert sent_replies[2][7:] == b"4567"
+        
+        os.close(fd)
+    
+    def test_handle_packet_readdir_sequence_advances(self, daemon, temp_root_dir, sent_replies):
+        """Test that READDIRs with increasing seqnos walk the directory"""
+        for name in ("a.txt", "b.txt", "c.txt"):
+            (Path(temp_root_dir) / name).write_text(name)
+        client_addr = ('127.0.0.1', 16384)
+        
+        # MOUNT, OPENDIR and READDIRs as the example client sends them
+        daemon.handle_packet(struct.pack('<HBB', 0, 0, TNFS_CMD.MOUNT) + b'/\x00test\x00test\x00', client_addr)
+        sid = struct.unpack_from('<H', sent_replies[-1])[0]
+        daemon.handle_packet(struct.pack('<HBB', sid, 1, TNFS_CMD.OPENDIR) + b'\x00', client_addr)
+        assert sent_replies[-1][4] == TNFS_ERROR.SUCCESS
+        handle_index = sent_replies[-1][5]
+        
+        names = []
+        for seqno in range(2, 10):
+            packet = struct.pack('<HBBB', sid, seqno, TNFS_CMD.READDIR, handle_index)
+            daemon.handle_packet(packet, client_addr)
+            if sent_replies[-1][4] == TNFS_ERROR.EOF:
+                break
+            names.append(sent_replies[-1][5:-1])
+        
+        assert sent_replies[-1][4] == TNFS_ERROR.EOF
+        assert sorted(names) == [b'.', b'..', b'a.txt', b'b.txt', b'c.txt']
+    
+    def test_send_tx_keeps_last_reply_per_session(self, daemon, temp_root_dir):
+        """Test that a reply survives later replies built in the transmit buffer"""
+        daemon.udp_socket = Mock()
+        first = Session(sid=1, ipaddr=0x7F000001, port=16384, root=temp_root_dir)
+        second = Session(sid=2, ipaddr=0x7F000001, port=16385, root=temp_root_dir)
+        
+        for session, seqno in ((first, 1), (second, 2), (second, 3)):
+            header = TNFSHeader(sid=session.sid, seqno=seqno, cmd=TNFS_CMD.TELLDIR,
+                               status=TNFS_ERROR.SUCCESS)
+            daemon.send_packed(session, header, struct.Struct('<I'), seqno)
+        
+        assert bytes(first.lastmsg) == struct.pack('<HBBBI', 1, 1, TNFS_CMD.TELLDIR, 0, 1)
+        assert bytes(second.lastmsg) == struct.pack('<HBBBI', 2, 3, TNFS_CMD.TELLDIR, 0, 3)
+    
     def test_handle_statfile_success(self, daemon, temp_root_dir):
         """Test successful file stat"""
         # Create a test file
@@ -430,6 +719,77 @@ class TestTNFSDaemon:
         
         # Should send response
         mock_socket.sendto.assert_called()
+    
+    def test_handle_opendirx_pattern(self, daemon, temp_root_dir, session, sent_replies):
+        """Test that OPENDIRX keeps only entries matching the glob pattern"""
+        for name in ("a.txt", "b.TXT", "c.bin", "d.txt.bak"):
+            (Path(temp_root_dir) / name).write_text(name)
+        
+        header = TNFSHeader(sid=1234, seqno=1, cmd=TNFS_CMD.OPENDIRX, status=0)
+        daemon.handle_opendirx(header, session, b'\x00\x00\x00\x00*.txt\x00/\x00')
+        
+        assert sent_replies[0][4] == TNFS_ERROR.SUCCESS
+        handle_index, count = struct.unpack_from('<BH', sent_replies[0], 5)
+        names = {e[13:-1] for e in session.dhandles[handle_index].entries}
+        if os.path.normcase('A') == 'a':
+            assert names == {b"a.txt", b"b.TXT"}
+        else:
+            assert names == {b"a.txt"}
+        assert count == len(names)
+    
+    def test_handle_readdirx_batches_entries(self, daemon, temp_root_dir, session, sent_replies):
+        """Test that READDIRX returns several entries in one reply"""
+        for name in ("a.txt", "b.txt", "c.txt"):
+            (Path(temp_root_dir) / name).write_text(name)
+        
+        dhnd_index = session.get_free_dhandle()
+        dhnd = DirectoryHandle(temp_root_dir)
+        assert dhnd.open()
+        dhnd.current_index = 0  # READDIRX has no . and .. entries
+        session.dhandles[dhnd_index] = dhnd
+        
+        header = TNFSHeader(sid=1234, seqno=1, cmd=TNFS_CMD.READDIRX, 
+                           status=0, ipaddr=0x7F000001, port=16384)
+        
+        daemon.handle_readdirx(header, session, bytes((dhnd_index, 0)))
+        
+        reply = sent_replies[0]
+        assert reply[4] == TNFS_ERROR.SUCCESS
+        count, dirstatus = reply[5], reply[6]
+        assert count == 3
+        assert dirstatus & 0x01  # EOF
+        assert reply.count(b"txt\x00") == 3
+    
+    def test_handle_readdirx_fills_reply(self, daemon, temp_root_dir, session, sent_replies):
+        """Test that READDIRX stops at a full reply and resumes from there"""
+        names = [f"{i:02d}" + "x" * 40 for i in range(30)]
+        for name in names:
+            (Path(temp_root_dir) / name).write_text("")
+        
+        dhnd_index = session.get_free_dhandle()
+        dhnd = DirectoryHandle(temp_root_dir)
+        assert dhnd.open(sorted(_scan_dir(temp_root_dir)))
+        dhnd.current_index = 0
+        session.dhandles[dhnd_index] = dhnd
+        
+        seen = []
+        while not sent_replies or not sent_replies[-1][6] & 0x01:
+            header = TNFSHeader(sid=1234, seqno=len(sent_replies), cmd=TNFS_CMD.READDIRX, status=0)
+            daemon.handle_readdirx(header, session, bytes((dhnd_index, 0)))
+            reply = sent_replies[-1]
+            assert len(reply) <= 532
+            # dpos is where this batch started
+            assert struct.unpack_from('<H', reply, 7)[0] == len(seen)
+            offset = 9
+            for _ in range(reply[5]):
+                end = reply.index(b"\x00", offset + 13)
+                seen.append(reply[offset + 13:end].decode())
+                offset = end + 1
+            assert offset == len(reply)
+        
+        # 9 entries of 56 bytes fit in a reply
+        assert len(sent_replies) == 4
+        assert seen == names
 
 
 class TestIntegration:
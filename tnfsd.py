@@ -13,18 +13,22 @@ MIT License
 
 import argparse
 import logging
-from nt import O_EXCL
 import os
 import socket
+import stat
 import struct
 import sys
 import time
-from dataclasses import dataclass
+from collections import OrderedDict, deque
 from enum import IntEnum
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, List, Optional, Tuple, Union
 import select
 import fnmatch
+import re
+import heapq
+from bisect import bisect_right
+from itertools import accumulate
 
 # Configure logging
 logging.basicConfig(
@@ -38,6 +42,10 @@ TNFSD_PORT = 16384
 MAXMSGSZ = 532
 MAX_FD_PER_CONN = 16
 MAX_DHND_PER_CONN = 8
+DIR_CACHE_SIZE = 64  # Directory snapshots kept, shared by all sessions
+DIR_CACHE_TTL = 0.5  # Seconds a snapshot may be reused (file sizes can change behind it)
+_FD_SLOTS_MASK = (1 << MAX_FD_PER_CONN) - 1
+_DH_SLOTS_MASK = (1 << MAX_DHND_PER_CONN) - 1
 MAX_CLIENTS = 4096
 MAX_CLIENTS_PER_IP = 4096
 MAX_TCP_CONN = 256
@@ -53,8 +61,13 @@ TIMEOUT_LSB = 0xE8
 TIMEOUT_MSB = 0x03
 MAX_FILENAME_LEN = 256
 MAX_IOSZ = 512
+UDP_BATCH = 16  # Datagrams read per select() wakeup
+TX_POOL_SIZE = 64  # Spare reply buffers kept for new sessions
 TNFS_DIRSTATUS_EOF = 0x01
 
+# MOUNT reply payload: protocol version and retry timeout
+_MOUNT_REPLY = bytes((PROTOVERSION_LSB, PROTOVERSION_MSB, TIMEOUT_LSB, TIMEOUT_MSB))
+
 # File open flags (for Windows compatibility)
 O_RDONLY = getattr(os, 'O_RDONLY', 0)
 O_WRONLY = getattr(os, 'O_WRONLY', 1)
@@ -62,8 +75,58 @@ O_RDWR = getattr(os, 'O_RDWR', 2)
 O_APPEND = getattr(os, 'O_APPEND', 8)
 O_CREAT = getattr(os, 'O_CREAT', 64)
 O_TRUNC = getattr(os, 'O_TRUNC', 512)
+O_EXCL = getattr(os, 'O_EXCL', 128)
 O_BINARY = getattr(os, 'O_BINARY', 0)  # Windows-specific, 0 on other platforms
 
+# TNFS open flag bits that map onto OS open flags
+_TNFS_OPEN_MASK = 0x070B
+
+def _translate_open_flags(flags: int) -> int:
+    """Translate TNFS open flags to OS open flags"""
+    file_flags = 0
+    if (flags & 0x0003) == 0x0001:  # Read
+        file_flags |= O_RDONLY
+    if (flags & 0x0003) == 0x0002:  # Write
+        file_flags |= O_WRONLY
+    if (flags & 0x0003) == 0x0003:  # Read/Write
+        file_flags |= O_RDWR
+    if flags & 0x0008:  # Append
+        file_flags |= O_APPEND
+    if flags & 0x0100:  # Create
+        file_flags |= O_CREAT
+    if flags & 0x0200:  # Truncate
+        file_flags |= O_TRUNC
+    if flags & 0x0400:  # Exclusive
+        file_flags |= O_EXCL
+    # Binary mode for Windows compatibility (like C code does)
+    return file_flags | O_BINARY
+
+# Every combination of the mapped bits, translated once at import
+_OPEN_FLAGS = {f: _translate_open_flags(f) for f in range(_TNFS_OPEN_MASK + 1)
+               if f & _TNFS_OPEN_MASK == f}
+
+# Pre-resolved os functions for the file I/O handlers
+_os_open = os.open
+_os_read = os.read
+_os_write = os.write
+_os_close = os.close
+_os_readv = getattr(os, 'readv', None)  # Not available on Windows
+_monotonic = time.monotonic
+_os_preadv = getattr(os, 'preadv', None)
+_os_pwrite = getattr(os, 'pwrite', None)
+# Per-call non-blocking receive, keeps sends blocking (not available on Windows)
+_MSG_DONTWAIT = getattr(socket, 'MSG_DONTWAIT', 0)
+# Where positional I/O exists, file positions are tracked per slot instead
+# of in the kernel, so SEEKFILE needs no syscall for SEEK_SET/SEEK_CUR.
+# None marks a slot that uses the kernel offset (O_APPEND, not a regular
+# file, or no pread).
+_FD_POS_START = 0 if _os_preadv is not None and _os_pwrite is not None else None
+
+_PARDIR_BYTES = os.fsencode(os.pardir)  # '..' for bytes paths
+
+# Client paths can be appended to the root as-is where '/' is the separator
+_SLASH_SEP = os.sep == '/' and os.altsep is None
+
 # Command classes
 class CLASS(IntEnum):
     SESSION = 0x00
@@ -142,61 +205,178 @@ class TNFS_ERROR(IntEnum):
     ESTALE = 0x20
     EOF = 0x21
 
-@dataclass
+# Precompiled wire formats
+_HDR_STRUCT = struct.Struct('<HBBB')      # Reply header: sid, seqno, cmd, status
+_REQ_HDR_STRUCT = struct.Struct('<HBB')   # Request header: sid, seqno, cmd
+_U8_STRUCT = struct.Struct('<B')          # Single byte field (handle replies)
+_U16_STRUCT = struct.Struct('<H')         # Little-endian 16-bit field
+_U32_STRUCT = struct.Struct('<I')         # Little-endian 32-bit field
+_OPEN_STRUCT = struct.Struct('<HH')       # OPENFILE request: flags, mode
+_DIRENT_STRUCT = struct.Struct('<BIII')   # Directory entry: flags, size, mtime, ctime
+_DIRENT_NAME_OFS = _DIRENT_STRUCT.size    # Entry name follows the fixed fields
+_STAT_STRUCT = struct.Struct('<HHHIIII')  # STATFILE reply: mode, uid, gid, size, atime, mtime, ctime
+_DIRHND_STRUCT = struct.Struct('<BH')     # OPENDIRX reply: handle, entry count
+_DIRX_HDR_STRUCT = struct.Struct('<BBH')  # READDIRX reply: count, status, dpos
+
+# Whole directory entry formats (fixed fields, name, NUL) by name length,
+# so a record is packed in one call; compiled on first use
+_DIRENT_FORMATS: Dict[int, struct.Struct] = {}
+
+def _dirent_struct(name_len: int) -> struct.Struct:
+    """Get the compiled format for a directory entry with a name_len byte name"""
+    fmt = _DIRENT_FORMATS.get(name_len)
+    if fmt is None:
+        fmt = _DIRENT_FORMATS[name_len] = struct.Struct('<BIII%dsx' % name_len)
+    return fmt
+
 class TNFSHeader:
     """TNFS packet header"""
-    sid: int = 0          # Session ID
-    seqno: int = 0        # Sequence number
-    cmd: int = 0          # Command
-    status: int = 0       # Status
-    ipaddr: int = 0       # Client address
-    port: int = 0         # Client port
+    __slots__ = ('sid', 'seqno', 'cmd', 'status', 'ipaddr', 'port')
+    
+    def __init__(self, sid: int = 0, seqno: int = 0, cmd: int = 0, status: int = 0,
+                 ipaddr: int = 0, port: int = 0):
+        self.sid = sid          # Session ID
+        self.seqno = seqno      # Sequence number
+        self.cmd = cmd          # Command
+        self.status = status    # Status
+        self.ipaddr = ipaddr    # Client address
+        self.port = port        # Client port
     
     def pack(self) -> bytes:
         """Pack header into bytes"""
-        return struct.pack('<HBBB', self.sid, self.seqno, self.cmd, self.status)
+        return _HDR_STRUCT.pack(self.sid, self.seqno, self.cmd, self.status)
     
     @classmethod
     def unpack(cls, data: bytes) -> 'TNFSHeader':
-        """Unpack bytes into header"""
-        if len(data) < 3:
-            raise ValueError("Header too short")
-        sid, seqno, cmd = struct.unpack('<HBB', data[:4])
-        return cls(sid=sid, seqno=seqno, cmd=cmd)
+        """Unpack bytes (or a memoryview) into header"""
+        try:
+            # Positional sid, seqno, cmd straight from the unpacked tuple
+            return cls(*_REQ_HDR_STRUCT.unpack_from(data, 0))
+        except struct.error:
+            raise ValueError("Header too short") from None
 
-@dataclass
 class DirectoryEntry:
     """Directory entry structure"""
-    flags: int = 0
-    size: int = 0
-    mtime: int = 0
-    ctime: int = 0
-    entrypath: str = ""
+    __slots__ = ('flags', 'size', 'mtime', 'ctime', 'entrypath')
+    
+    def __init__(self, flags: int = 0, size: int = 0, mtime: int = 0, ctime: int = 0,
+                 entrypath: bytes = b""):
+        self.flags = flags
+        self.size = size
+        self.mtime = mtime
+        self.ctime = ctime
+        self.entrypath = entrypath
     
     def pack(self) -> bytes:
         """Pack directory entry into bytes"""
-        path_bytes = self.entrypath.encode('utf-8', errors='ignore')
-        if len(path_bytes) > MAX_FILENAME_LEN - 1:
-            path_bytes = path_bytes[:MAX_FILENAME_LEN - 1]
-        path_bytes += b'\x00'
-        
-        return struct.pack('<BIII', self.flags, self.size, self.mtime, self.ctime) + path_bytes
+        name = self.entrypath[:MAX_FILENAME_LEN - 1]
+        return _dirent_struct(len(name)).pack(self.flags, self.size, self.mtime, self.ctime, name)
+
+def _cstring_ends(buf: bytes, start: int, count: int) -> List[int]:
+    """Find the NUL terminators of up to count consecutive C strings"""
+    ends = []
+    find = buf.find
+    while len(ends) < count:
+        end = find(b'\x00', start)
+        if end < 0:
+            break
+        ends.append(end)
+        start = end + 1
+    return ends
+
+def _cpath(buf: bytes, start: int = 0) -> bytes:
+    """Get the NUL-terminated path at start (or up to the end of buf) as bytes"""
+    end = buf.find(b'\x00', start)
+    if end < 0:
+        end = len(buf)
+    return buf[start:end]
+
+def _cstring(buf: bytes, start: int = 0) -> str:
+    """Decode the NUL-terminated string at start (or up to the end of buf)"""
+    end = buf.find(b'\x00', start)
+    if end < 0:
+        end = len(buf)
+    return str(memoryview(buf)[start:end], 'utf-8', 'ignore')
+
+def _pack_dirent(flags: int, size: int, mtime: int, ctime: int, name: bytes) -> bytes:
+    """Pack a directory entry in READDIRX wire format"""
+    name = name[:MAX_FILENAME_LEN - 1]
+    return _dirent_struct(len(name)).pack(flags, min(size, 0xFFFFFFFF), mtime & 0xFFFFFFFF,
+                                          ctime & 0xFFFFFFFF, name)
+
+def _dirent_name(record: bytes) -> str:
+    """Extract the entry name from a packed directory entry"""
+    return record[_DIRENT_NAME_OFS:-1].decode('utf-8', errors='ignore')
+
+def _compile_glob(pattern: bytes):
+    """Compile a bytes glob pattern into a regex match function"""
+    # fnmatch only translates str patterns; latin-1 maps bytes 1:1
+    regex = fnmatch.translate(pattern.decode('latin-1')).encode('latin-1')
+    # Match case-insensitively where the filesystem does, like fnmatch()
+    return re.compile(regex, re.IGNORECASE if os.path.normcase('A') == 'a' else 0).match
+
+def _scan_dir(path: Union[str, bytes]) -> List[bytes]:
+    """Snapshot a directory as a list of packed directory entries"""
+    entries = []
+    # Hoisted out of the per-entry loop, the hottest one in the daemon
+    append = entries.append
+    is_dir = stat.S_ISDIR
+    is_reg = stat.S_ISREG
+    dir_flag = int(DIRENTRY_FLAGS.DIR)
+    hidden_flag = int(DIRENTRY_FLAGS.HIDDEN)
+    formats = _DIRENT_FORMATS
+    max_name = MAX_FILENAME_LEN - 1
+    # Scanning a bytes path yields names already encoded for the wire
+    with os.scandir(os.fsencode(path)) as it:
+        for e in it:
+            try:
+                # One stat per entry (followed through symlinks, cached by
+                # DirEntry); the type comes from the same result
+                st = e.stat()
+            except OSError:
+                # Skip entries we cannot stat (e.g. dangling symlinks)
+                continue
+            name = e.name[:max_name]
+            mode = st.st_mode
+            if is_dir(mode):
+                flags = dir_flag
+            else:
+                flags = 0
+            # Only regular files have a meaningful size (not FIFOs, devices)
+            size = min(st.st_size, 0xFFFFFFFF) if is_reg(mode) else 0
+            if name[:1] == b'.':
+                flags |= hidden_flag
+            fmt = formats.get(len(name)) or _dirent_struct(len(name))
+            append(fmt.pack(flags, size, int(st.st_mtime) & 0xFFFFFFFF,
+                            int(st.st_ctime) & 0xFFFFFFFF, name))
+    return entries
 
 class DirectoryHandle:
     """Directory handle for managing directory operations"""
-    def __init__(self, path: str):
+    __slots__ = ('path', 'entry_count', 'entries', 'current_index', 'dot', '_blob', '_offsets')
+    
+    def __init__(self, path: Union[str, bytes]):
         self.path = path
-        self.handle = None
         self.entry_count = 0
-        self.entry_list = []
-        self.current_entry = None
         self.entries = []
         self.current_index = 0
+        self.dot = None  # Packed '.' entry, if known at open
+        # Entries as one contiguous block and their start offsets, built
+        # on first batched read
+        self._blob = None
+        self._offsets = None
         
-    def open(self):
-        """Open directory handle"""
+    def open(self, entries: Optional[List[bytes]] = None, dir_stat: Optional[os.stat_result] = None):
+        """Open directory handle, optionally from an existing snapshot
+        
+        dir_stat is the directory's own stat result, used for the '.' entry.
+        """
         try:
-            self.entries = list(Path(self.path).iterdir())
+            self.entries = _scan_dir(self.path) if entries is None else entries
+            self._blob = self._offsets = None
+            if dir_stat is not None:
+                self.dot = _pack_dirent(DIRENTRY_FLAGS.DIR, 0, int(dir_stat.st_mtime),
+                                        int(dir_stat.st_ctime), b'.')
             self.entry_count = len(self.entries)
             # Prepare to return '.' and '..' first, like POSIX readdir
             self.current_index = -2
@@ -208,67 +388,67 @@ class DirectoryHandle:
     def close(self):
         """Close directory handle"""
         self.entries = []
+        self.dot = None
+        self._blob = self._offsets = None
         self.current_index = 0
         self.entry_count = 0
     
-    def read_entry(self) -> Optional[DirectoryEntry]:
-        """Read next directory entry"""
+    def read_entry_packed(self) -> Optional[bytes]:
+        """Read next directory entry in wire format"""
         # Synthesize '.' and '..' first for compatibility with C version
         try:
             if self.current_index == -2:
                 self.current_index += 1
-                p = Path(self.path)
-                st = p.stat()
-                return DirectoryEntry(
-                    flags=int(DIRENTRY_FLAGS.DIR),
-                    size=0,
-                    mtime=int(st.st_mtime),
-                    ctime=int(st.st_ctime),
-                    entrypath='.'
-                )
+                if self.dot is not None:
+                    return self.dot
+                st = os.stat(self.path)
+                return _pack_dirent(DIRENTRY_FLAGS.DIR, 0, int(st.st_mtime), int(st.st_ctime), b'.')
             if self.current_index == -1:
                 self.current_index += 1
-                p = Path(self.path).parent
                 # In case parent stats fail, fall back to zeros
                 try:
-                    st = p.stat()
+                    st = os.stat(os.path.join(self.path, os.pardir if isinstance(self.path, str) else _PARDIR_BYTES))
                     mtime = int(st.st_mtime)
                     ctime = int(st.st_ctime)
                 except Exception:
                     mtime = 0
                     ctime = 0
-                return DirectoryEntry(
-                    flags=int(DIRENTRY_FLAGS.DIR),
-                    size=0,
-                    mtime=mtime,
-                    ctime=ctime,
-                    entrypath='..'
-                )
+                return _pack_dirent(DIRENTRY_FLAGS.DIR, 0, mtime, ctime, b'..')
 
             if self.current_index >= len(self.entries):
                 return None
 
-            entry_path = self.entries[self.current_index]
+            # Served from the snapshot taken in open()
+            record = self.entries[self.current_index]
             self.current_index += 1
-
-            stat = entry_path.stat()
-            flags = 0
-            if entry_path.is_dir():
-                flags |= int(DIRENTRY_FLAGS.DIR)
-            if entry_path.name.startswith('.'):
-                flags |= int(DIRENTRY_FLAGS.HIDDEN)
-
-            return DirectoryEntry(
-                flags=flags,
-                size=stat.st_size if entry_path.is_file() else 0,
-                mtime=int(stat.st_mtime),
-                ctime=int(stat.st_ctime),
-                entrypath=entry_path.name
-            )
+            return record
         except Exception as e:
             logger.error(f"Error reading directory entry: {e}")
             return None
     
+    def packed_view(self) -> Tuple[memoryview, List[int]]:
+        """Get the entries as one contiguous block, plus the offset of each
+        entry and of the end of the block"""
+        if self._blob is None:
+            self._blob = memoryview(b''.join(self.entries))
+            self._offsets = [0]
+            self._offsets.extend(accumulate(map(len, self.entries)))
+        return self._blob, self._offsets
+    
+    def read_entry(self) -> Optional[DirectoryEntry]:
+        """Read next directory entry"""
+        record = self.read_entry_packed()
+        if record is None:
+            return None
+        flags, size, mtime, ctime = _DIRENT_STRUCT.unpack_from(record)
+        return DirectoryEntry(
+            flags=flags,
+            size=size,
+            mtime=mtime,
+            ctime=ctime,
+            entrypath=record[_DIRENT_NAME_OFS:-1]
+        )
+    
     def seek(self, position: int):
         """Seek to position in directory"""
         if 0 <= position < len(self.entries):
@@ -280,6 +460,9 @@ class DirectoryHandle:
 
 class Session:
     """TNFS session for managing client connections"""
+    __slots__ = ('sid', 'ipaddr', 'port', 'root', 'last_contact', 'seqno', 'fd', 'dhandles',
+                 'lastmsg', 'lastmsgsz', 'lastseqno', 'isTCP', 'fd_pos', '_fd_mask', '_dh_mask', '_fd_slot', 'fd_by_path', '_fd_path', '_addr', '_lastbuf')
+    
     def __init__(self, sid: int, ipaddr: int, port: int, root: str):
         self.sid = sid
         self.ipaddr = ipaddr
@@ -288,63 +471,220 @@ class Session:
         self.last_contact = time.time()
         self.seqno = 0
         self.fd = [None] * MAX_FD_PER_CONN  # File descriptors
+        self.fd_pos = [_FD_POS_START] * MAX_FD_PER_CONN  # File positions
         self.dhandles = [None] * MAX_DHND_PER_CONN  # Directory handles
+        # Bitmasks of reserved slots
+        self._fd_mask = 0
+        self._dh_mask = 0
+        self._fd_slot = {}  # OS file descriptor -> slot index
+        self.fd_by_path: Dict[bytes, int] = {}  # Resolved path -> open OS file descriptor
+        self._fd_path = {}  # OS file descriptor -> resolved path
+        self._addr = None  # Client socket address, built on first reply
         self.lastmsg = b''
+        self._lastbuf = None  # Reply buffer lastmsg points into
         self.lastmsgsz = 0
         self.lastseqno = 0
         self.isTCP = False
         
+    def sockaddr(self) -> Tuple[str, int]:
+        """Get the client's (host, port) socket address"""
+        addr = self._addr
+        if addr is None:
+            addr = self._addr = (socket.inet_ntoa(self.ipaddr.to_bytes(4, 'little')), self.port)
+        return addr
+    
     def get_free_fd(self) -> Optional[int]:
         """Get free file descriptor slot"""
-        for i, fd in enumerate(self.fd):
-            if fd is None:
+        free = ~self._fd_mask & _FD_SLOTS_MASK
+        while free:
+            low = free & -free  # Lowest free slot
+            self._fd_mask |= low
+            i = low.bit_length() - 1
+            # Skip slots that were filled without reserving them
+            if self.fd[i] is None:
                 return i
+            free ^= low
         return None
     
+    def assign_fd(self, index: int, fd: int, path: Optional[bytes] = None, kernel_pos: bool = False):
+        """Store an open file descriptor in a slot"""
+        self.fd[index] = fd
+        # Appends and unseekable files go through the kernel offset,
+        # pwrite() would ignore ours and pread()/pwrite() fail with ESPIPE
+        self.fd_pos[index] = None if kernel_pos else _FD_POS_START
+        self._fd_slot[fd] = index
+        if path is not None:
+            self.fd_by_path[path] = fd
+            self._fd_path[fd] = path
+    
+    def find_fd_slot(self, fd: int) -> Optional[int]:
+        """Get the slot holding an open file descriptor"""
+        return self._fd_slot.get(fd)
+    
+    def release_fd(self, index: int):
+        """Release file descriptor slot"""
+        fd = self.fd[index]
+        self._fd_slot.pop(fd, None)
+        path = self._fd_path.pop(fd, None)
+        if path is not None and self.fd_by_path.get(path) == fd:
+            del self.fd_by_path[path]
+        self.fd[index] = None
+        self.fd_pos[index] = _FD_POS_START
+        self._fd_mask &= ~(1 << index)
+    
+    def forget_path(self, path: bytes):
+        """Stop mapping a path (and anything below it) to open descriptors"""
+        prefix = os.path.join(path, path[:0])  # path plus a separator
+        for p in [p for p in self.fd_by_path if p == path or p.startswith(prefix)]:
+            del self._fd_path[self.fd_by_path.pop(p)]
+    
     def get_free_dhandle(self) -> Optional[int]:
         """Get free directory handle slot"""
-        for i, handle in enumerate(self.dhandles):
-            if handle is None:
+        free = ~self._dh_mask & _DH_SLOTS_MASK
+        while free:
+            low = free & -free
+            self._dh_mask |= low
+            i = low.bit_length() - 1
+            if self.dhandles[i] is None:
                 return i
+            free ^= low
         return None
     
+    def release_dhandle(self, index: int):
+        """Release directory handle slot"""
+        self.dhandles[index] = None
+        self._dh_mask &= ~(1 << index)
+    
     def cleanup(self):
         """Clean up session resources"""
-        # Close all open files
+        # Close all open files (slots hold raw OS descriptors)
         for fd in self.fd:
             if fd is not None:
                 try:
-                    fd.close()
-                except:
+                    _os_close(fd)
+                except OSError:
                     pass
         
         # Close all directory handles
         for handle in self.dhandles:
             if handle is not None:
                 handle.close()
+        
+        # Reset the tables in bulk
+        self.fd = [None] * MAX_FD_PER_CONN
+        self.fd_pos = [_FD_POS_START] * MAX_FD_PER_CONN
+        self.dhandles = [None] * MAX_DHND_PER_CONN
+        self._fd_mask = 0
+        self._dh_mask = 0
+        self._fd_slot.clear()
+        self.fd_by_path.clear()
+        self._fd_path.clear()
 
 class TNFSDaemon:
     """Main TNFS daemon class"""
     def __init__(self, root_dir: str, port: int = TNFSD_PORT):
         self.root_dir = Path(root_dir).resolve()
+        self._root_str = str(self.root_dir)
+        # Client paths stay bytes end to end, resolved against the root in
+        # the filesystem encoding; they must equal it or start with this prefix
+        self._root_bytes = os.fsencode(self._root_str)
+        self._root_prefix = os.path.join(self._root_bytes, b'')
         self.port = port
         self.sessions: Dict[int, Session] = {}
-        self.sessions_by_ip: Dict[int, List[Session]] = {}
+        self.sessions_by_ip: Dict[int, Session] = {}  # One session per client IP
         self.next_sid = 1
+        # (deadline, sid) per session; entries are re-checked when they come due
+        self._expiry_heap: List[Tuple[float, int]] = []
         self.udp_socket = None
         self.tcp_socket = None
         self.running = False
+        # Receive buffer reused for every UDP datagram
+        self._rx_buf = bytearray(MAXMSGSZ)
+        self._rx_view = memoryview(self._rx_buf)
+        # Transmit buffer replies are assembled in; once sent it stays with
+        # the session as its retransmit copy and the session's previous
+        # buffer takes its place
+        self._tx_pool = deque()
+        self._tx_view = self.acquire_tx()
+        self._tx_buf = self._tx_view.obj
+        # Bumped on every change made through the daemon, invalidates cached
+        # directory snapshots; changes made by other processes are not seen
+        # until the snapshot's DIR_CACHE_TTL runs out
+        self._dir_generation = 0
+        # Resolved path -> (validity key, time cached, directory snapshot);
+        # snapshots are never modified, so every session can share them
+        self._dir_cache = OrderedDict()
         
         # Validate root directory
-        if not self.root_dir.exists() or not self.root_dir.is_dir():
+        if not os.path.isdir(self._root_str):
             raise ValueError(f"Invalid root directory: {root_dir}")
         
         logger.info(f"TNFS daemon initialized with root: {self.root_dir}")
     
+    def resolve_path(self, path: bytes) -> bytes:
+        """Map a client path to a filesystem path under the root
+
+        Raises PermissionError for paths that escape the root via '..'.
+        """
+        rel = path.lstrip(b'/')
+        # Paths with no '.', '..' or empty components are already normal
+        if (_SLASH_SEP and b'//' not in rel and b'/.' not in b'/' + rel
+                and not rel.endswith(b'/')):
+            return self._root_prefix + rel if rel else self._root_bytes
+        full_path = os.path.normpath(os.path.join(self._root_bytes, rel))
+        if not full_path.startswith(self._root_prefix) and full_path != self._root_bytes:
+            raise PermissionError(f"Path outside root: {path}")
+        return full_path
+    
+    def forget_path(self, full_path: bytes):
+        """Drop cached open descriptors for a path that was unlinked or renamed"""
+        for session in self.sessions.values():
+            if session.fd_by_path:
+                session.forget_path(full_path)
+    
+    def get_cached_dir(self, path: bytes, key) -> Optional[List[bytes]]:
+        """Get a directory snapshot if it is still valid for key and not expired"""
+        cached = self._dir_cache.get(path)
+        if cached is None or cached[0] != key or _monotonic() - cached[1] > DIR_CACHE_TTL:
+            return None
+        self._dir_cache.move_to_end(path)
+        return cached[2]
+    
+    def cache_dir(self, path: bytes, key, entries: List[bytes]):
+        """Remember a directory snapshot, evicting the least recently used"""
+        self._dir_cache[path] = (key, _monotonic(), entries)
+        self._dir_cache.move_to_end(path)
+        if len(self._dir_cache) > DIR_CACHE_SIZE:
+            self._dir_cache.popitem(last=False)
+    
+    def snapshot_dir(self, full_path: bytes) -> Tuple[os.stat_result, List[bytes]]:
+        """Get a directory's stat and packed entries, reusing a cached snapshot
+
+        Sizes and mtimes in the listing may be up to DIR_CACHE_TTL seconds out
+        of date for files changed outside the daemon.
+        Raises OSError (NotADirectoryError for non-directories) on failure.
+        """
+        # One stat answers both "does it exist" and "is it a directory"
+        st = os.stat(full_path)
+        if not stat.S_ISDIR(st.st_mode):
+            raise NotADirectoryError(full_path)
+        # A snapshot is reused only while neither the directory nor anything
+        # written through the daemon has changed. Writes by other processes
+        # to files inside it (and changes within one tick of a coarse
+        # directory mtime) show in neither, so reuse is also limited to
+        # DIR_CACHE_TTL after the scan
+        key = (st.st_mtime_ns, self._dir_generation)
+        entries = self.get_cached_dir(full_path, key)
+        if entries is None:
+            entries = _scan_dir(full_path)
+            self.cache_dir(full_path, key, entries)
+        return st, entries
+    
     def get_new_sid(self) -> int:
         """Generate new session ID"""
         sid = self.next_sid
-        self.next_sid = (self.next_sid + 1) % 65536
+        # Wrap around to 1; clients use sid 0 before they have a session
+        self.next_sid = self.next_sid % 65535 + 1
         return sid
     
     def create_session(self, ipaddr: int, port: int, root: str) -> Session:
@@ -354,9 +694,8 @@ class TNFSDaemon:
         self.sessions[sid] = session
         
         # Track by IP
-        if ipaddr not in self.sessions_by_ip:
-            self.sessions_by_ip[ipaddr] = []
-        self.sessions_by_ip[ipaddr].append(session)
+        self.sessions_by_ip[ipaddr] = session
+        heapq.heappush(self._expiry_heap, (session.last_contact + SESSION_TIMEOUT, sid))
         
         logger.info(f"Created session {sid} for {ipaddr}:{port}")
         return session
@@ -367,36 +706,41 @@ class TNFSDaemon:
     
     def find_session_by_ip(self, ipaddr: int) -> Optional[Session]:
         """Find session by IP address"""
-        sessions = self.sessions_by_ip.get(ipaddr, [])
-        return sessions[0] if sessions else None
+        return self.sessions_by_ip.get(ipaddr)
     
     def remove_session(self, session: Session):
         """Remove session"""
         if session.sid in self.sessions:
             del self.sessions[session.sid]
         
-        if session.ipaddr in self.sessions_by_ip:
-            self.sessions_by_ip[session.ipaddr] = [
-                s for s in self.sessions_by_ip[session.ipaddr] 
-                if s.sid != session.sid
-            ]
-            if not self.sessions_by_ip[session.ipaddr]:
-                del self.sessions_by_ip[session.ipaddr]
+        # Leave the entry alone if a newer session took over the IP
+        if self.sessions_by_ip.get(session.ipaddr) is session:
+            del self.sessions_by_ip[session.ipaddr]
         
         session.cleanup()
+        if session._lastbuf is not None:
+            self.release_tx(session._lastbuf)
+            session._lastbuf = None
+            session.lastmsg = b''
         logger.info(f"Removed session {session.sid}")
     
     def cleanup_expired_sessions(self):
         """Remove expired sessions"""
         current_time = time.time()
-        expired = []
+        heap = self._expiry_heap
         
-        for session in self.sessions.values():
-            if current_time - session.last_contact > SESSION_TIMEOUT:
-                expired.append(session)
-        
-        for session in expired:
-            self.remove_session(session)
+        # Only sessions whose deadline passed are looked at; ones that were
+        # active since are pushed back with their current deadline
+        while heap and heap[0][0] < current_time:
+            _, sid = heapq.heappop(heap)
+            session = self.sessions.get(sid)
+            if session is None:
+                continue
+            deadline = session.last_contact + SESSION_TIMEOUT
+            if deadline < current_time:
+                self.remove_session(session)
+            else:
+                heapq.heappush(heap, (deadline, sid))
     
     def setup_sockets(self):
         """Setup UDP and TCP sockets"""
@@ -415,8 +759,46 @@ class TNFSDaemon:
     
     def send_response(self, session: Session, header: TNFSHeader, data: bytes = b''):
         """Send response to client"""
-        response = header.pack() + data
-        
+        size = _HDR_STRUCT.size + len(data)
+        if size <= MAXMSGSZ:
+            self._tx_buf[_HDR_STRUCT.size:size] = data
+            self.send_tx(session, header, size)
+        else:
+            self._send(session, header, header.pack() + data)
+    
+    def send_tx(self, session: Session, header: TNFSHeader, size: int):
+        """Send a reply whose payload was written into the transmit buffer"""
+        tx_view = self._tx_view
+        _HDR_STRUCT.pack_into(self._tx_buf, 0, header.sid, header.seqno, header.cmd, header.status)
+        self._send(session, header, tx_view[:size])
+        # The session keeps this buffer for retransmits, hand back its old one
+        spare = session._lastbuf
+        session._lastbuf = tx_view
+        if spare is None:
+            spare = self.acquire_tx()
+        self._tx_view = spare
+        self._tx_buf = spare.obj
+    
+    def acquire_tx(self) -> memoryview:
+        """Take a spare reply buffer from the pool"""
+        if self._tx_pool:
+            return self._tx_pool.pop()
+        return memoryview(bytearray(MAXMSGSZ))
+    
+    def release_tx(self, view: memoryview):
+        """Return a reply buffer to the pool"""
+        if len(self._tx_pool) < TX_POOL_SIZE:
+            self._tx_pool.append(view)
+    
+    def send_packed(self, session: Session, header: TNFSHeader, fmt: struct.Struct, *values):
+        """Send a fixed-layout reply packed straight into the transmit buffer"""
+        fmt.pack_into(self._tx_buf, _HDR_STRUCT.size, *values)
+        self.send_tx(session, header, _HDR_STRUCT.size + fmt.size)
+    
+    def _send(self, session: Session, header: TNFSHeader, response):
+        """Record a reply for retransmission and send it"""
+        # Kept for retransmission; replies built in the transmit buffer
+        # leave that buffer with the session (see send_tx)
         session.lastmsg = response
         session.lastmsgsz = len(response)
         session.lastseqno = header.seqno
@@ -427,15 +809,32 @@ class TNFSDaemon:
                 pass  # TODO: Implement TCP response
             else:
                 # UDP response
-                client_addr = (socket.inet_ntoa(struct.pack('<I', session.ipaddr)), session.port)
-                self.udp_socket.sendto(response, client_addr)
+                self.udp_socket.sendto(response, session.sockaddr())
         except Exception as e:
             logger.error(f"Failed to send response: {e}")
 
+    def resend_last(self, session: Session):
+        """Retransmit the last reply sent to a session"""
+        try:
+            if not session.isTCP:
+                self.udp_socket.sendto(session.lastmsg, session.sockaddr())
+        except Exception as e:
+            logger.error(f"Failed to resend response: {e}")
+
+    def reply_header(self, session: Session, header: TNFSHeader,
+                     status: int = TNFS_ERROR.SUCCESS) -> TNFSHeader:
+        """Turn a request header into the header of its reply
+
+        The request header is updated in place rather than allocating a new
+        one; seqno and cmd carry over unchanged.
+        """
+        header.sid = session.sid
+        header.status = status
+        return header
+
     def send_error(self, session: Session, header: TNFSHeader, error: bytes):
         """Send error response"""
-        error_header = TNFSHeader(sid=session.sid, seqno=header.seqno, cmd=header.cmd, status=error)
-        self.send_response(session, error_header)
+        self.send_response(session, self.reply_header(session, header, error))
     
     def handle_mount(self, header: TNFSHeader, data: bytes, client_addr: Tuple[str, int]) -> Session:
         """Handle TNFS_MOUNT command"""
@@ -446,20 +845,19 @@ class TNFSDaemon:
                 return None
 
             # Extract mountpoint, username, password
-            version_raw = struct.unpack_from('<H', data, 0)[0]
+            version_raw = _U16_STRUCT.unpack_from(data, 0)[0]
             version_major = version_raw >> 8
             version_minor = version_raw & 0xFF
 
-            mount_point = data[2]
-
-            offset = 3
-            parts = data[offset:].rstrip(b'\x00').split(b'\x00', 2)
-            if len(parts) == 2:
-                username = parts[0].decode('utf-8', errors='ignore')
-                password = parts[1].decode('utf-8', errors='ignore')
+            # Mount point, username and password follow as C strings
+            ends = _cstring_ends(data, 2, 3)
+            mount_point = _cstring(data, 2)
+            if len(ends) == 3:
+                username = _cstring(data, ends[0] + 1)
+                password = _cstring(data, ends[1] + 1)
             
             # For now, ignore authentication
-            ipaddr = struct.unpack('<I', socket.inet_aton(client_addr[0]))[0]
+            ipaddr = int.from_bytes(socket.inet_aton(client_addr[0]), 'little')
             
             # Check if session already exists for this IP
             existing_session = self.find_session_by_ip(ipaddr)
@@ -470,8 +868,8 @@ class TNFSDaemon:
             session = self.create_session(ipaddr, client_addr[1], mount_point)
             
             # Send mount response
-            response_data = struct.pack('<BBBB', PROTOVERSION_LSB, PROTOVERSION_MSB, TIMEOUT_LSB, TIMEOUT_MSB)
-            response_header = TNFSHeader(sid=session.sid, seqno=header.seqno, cmd=header.cmd, status=TNFS_ERROR.SUCCESS)
+            response_data = _MOUNT_REPLY
+            response_header = self.reply_header(session, header)
             self.send_response(session, response_header, response_data)
             
             logger.info(f"Client {client_addr[0]}:{client_addr[1]} mounted {mount_point}")
@@ -499,11 +897,24 @@ class TNFSDaemon:
                 self.send_error(session, header, TNFS_ERROR.EINVAL)
                 return None
 
-            path = data.rstrip(b'\x00').decode('utf-8', errors='ignore')
-            full_path = self.root_dir / path.lstrip('/')
+            path = _cpath(data)
+            full_path = self.resolve_path(path)
             
-            if not full_path.exists() or not full_path.is_dir():
-                logger.error("Directory does not exist")
+            try:
+                dir_stat, entries = self.snapshot_dir(full_path)
+            except NotADirectoryError:
+                logger.error("Not a directory")
+                self.send_error(session, header, TNFS_ERROR.ENOTDIR)
+                return None
+            except OSError as e:
+                logger.error(f"Directory does not exist: {e}")
+                self.send_error(session, header, TNFS_ERROR.ENOENT)
+                return None
+
+            # Create directory handle
+            dir_handle = DirectoryHandle(full_path)
+            if not dir_handle.open(entries, dir_stat):
+                logger.error("Failed to open directory")
                 self.send_error(session, header, TNFS_ERROR.ENOENT)
                 return None
 
@@ -514,19 +925,11 @@ class TNFSDaemon:
                 self.send_error(session, header, TNFS_ERROR.EMFILE)
                 return None
 
-            # Create directory handle
-            dir_handle = DirectoryHandle(str(full_path))
-            if not dir_handle.open():
-                logger.error("Failed to open directory")
-                self.send_error(session, header, TNFS_ERROR.ENOENT)
-                return None
-
             session.dhandles[handle_index] = dir_handle
             
             # Send response with handle index
-            response_data = struct.pack('<B', handle_index)
-            response_header = TNFSHeader(sid=session.sid, seqno=header.seqno, cmd=header.cmd, status=TNFS_ERROR.SUCCESS)
-            self.send_response(session, response_header, response_data)
+            response_header = self.reply_header(session, header)
+            self.send_packed(session, response_header, _U8_STRUCT, handle_index)
             
         except Exception as e:
             logger.error(f"Opendir failed: {e}")
@@ -547,16 +950,16 @@ class TNFSDaemon:
                 return None
 
             dir_handle = session.dhandles[handle_index]
-            entry = dir_handle.read_entry()
+            record = dir_handle.read_entry_packed()
  
-            if entry is None:
+            if record is None:
                 # End of directory
                 self.send_error(session, header, TNFS_ERROR.EOF)
             else:
-                # Send only the null-terminated entry name (legacy READDIR)
-                name_bytes = entry.entrypath.encode('utf-8', errors='ignore') + b'\x00'
-                response_data = name_bytes
-                response_header = TNFSHeader(sid=session.sid, seqno=header.seqno, cmd=header.cmd, status=TNFS_ERROR.SUCCESS)
+                # Send only the null-terminated entry name (legacy READDIR),
+                # copied from the pre-packed record into the transmit buffer
+                response_data = memoryview(record)[_DIRENT_NAME_OFS:]
+                response_header = self.reply_header(session, header)
                 self.send_response(session, response_header, response_data)
  
         except Exception as e:
@@ -579,10 +982,10 @@ class TNFSDaemon:
 
             # Close directory handle
             session.dhandles[handle_index].close()
-            session.dhandles[handle_index] = None
+            session.release_dhandle(handle_index)
             
             # Send success response
-            response_header = TNFSHeader(sid=session.sid, seqno=header.seqno, cmd=header.cmd, status=TNFS_ERROR.SUCCESS)
+            response_header = self.reply_header(session, header)
             self.send_response(session, response_header)
             
         except Exception as e:
@@ -597,48 +1000,31 @@ class TNFSDaemon:
                 self.send_error(session, header, TNFS_ERROR.EINVAL)
                 return None
 
-            flags = struct.unpack('<H', data[0:2])[0]
-            mode = struct.unpack('<H', data[2:4])[0]
-            filename = data[4:].rstrip(b'\x00').decode('utf-8', errors='ignore')
+            flags, mode = _OPEN_STRUCT.unpack_from(data, 0)
+            filename = _cpath(data, 4)
             
-            full_path = self.root_dir / filename.lstrip('/')
+            full_path = self.resolve_path(filename)
+            
+            # Open file
+            file_flags = _OPEN_FLAGS[flags & _TNFS_OPEN_MASK]
+            fd = _os_open(full_path, file_flags, mode)
+            if file_flags & (O_CREAT | O_TRUNC):
+                self._dir_generation += 1
             
             # Get free file descriptor
             fd_index = session.get_free_fd()
             if fd_index is None:
+                _os_close(fd)
                 logger.error("No free file descriptors")
                 self.send_error(session, header, TNFS_ERROR.EMFILE)
                 return None
-
-            # Open file
-            file_flags = 0
-            if (flags & 0x0003) == 0x0001:  # Read
-                file_flags |= O_RDONLY
-            if (flags & 0x0003) == 0x0002:  # Write
-                file_flags |= O_WRONLY
-            if (flags & 0x0003) == 0x0003:  # Read/Write
-                file_flags |= O_RDWR
-
-            if flags & 0x0008:  # Append
-                file_flags |= O_APPEND
-            if flags & 0x0100:  # Create
-                file_flags |= O_CREAT
-            if flags & 0x0200:  # Truncate
-                file_flags |= O_TRUNC
-            if flags & 0x0400:  # Exclusive
-                file_flags |= O_EXCL
-            
-            # Add binary mode flag for Windows compatibility (like C code does)
-            if os.name == 'nt':  # Windows
-                file_flags |= O_BINARY
-            
-            fd = os.open(str(full_path), file_flags, mode)
-            session.fd[fd_index] = fd
+            # FIFOs, devices and the like cannot be read or written at an offset
+            kernel_pos = bool(file_flags & O_APPEND) or not stat.S_ISREG(os.fstat(fd).st_mode)
+            session.assign_fd(fd_index, fd, full_path, kernel_pos)
             
             # Send response with file descriptor index
-            response_data = struct.pack('<B', fd_index)
-            response_header = TNFSHeader(sid=session.sid, seqno=header.seqno, cmd=header.cmd, status=TNFS_ERROR.SUCCESS)
-            self.send_response(session, response_header, response_data)
+            response_header = self.reply_header(session, header)
+            self.send_packed(session, response_header, _U8_STRUCT, fd_index)
             
         except Exception as e:
             logger.error(f"Openfile failed: {e}")
@@ -653,24 +1039,37 @@ class TNFSDaemon:
                 return None
 
             fd_index = data[0]
-            size = struct.unpack('<H', data[1:3])[0]
+            size = _U16_STRUCT.unpack_from(data, 1)[0]
             
-            if fd_index >= MAX_FD_PER_CONN or session.fd[fd_index] is None:
+            fd = session.fd[fd_index] if fd_index < MAX_FD_PER_CONN else None
+            if fd is None:
                 logger.error("Invalid file descriptor")
                 self.send_error(session, header, TNFS_ERROR.EBADF)
                 return None
 
-            # Read data
-            data_read = os.read(session.fd[fd_index], min(size, MAX_IOSZ))
+            # Read straight into the transmit buffer, after the reply header
+            # and the length field
+            start = _HDR_STRUCT.size + _U16_STRUCT.size
+            count = min(size, MAX_IOSZ)
+            pos = session.fd_pos[fd_index]
+            if pos is not None:
+                nread = _os_preadv(fd, [self._tx_view[start:start + count]], pos)
+                session.fd_pos[fd_index] = pos + nread
+            elif _os_readv is not None:
+                nread = _os_readv(fd, [self._tx_view[start:start + count]])
+            else:
+                data_read = _os_read(fd, count)
+                nread = len(data_read)
+                self._tx_buf[start:start + nread] = data_read
 
-            if not data_read:
+            if not nread:
                 self.send_error(session, header, TNFS_ERROR.EOF)
                 return None
 
             # Send response with data
-            response_data = struct.pack('<H', len(data_read)) + data_read
-            response_header = TNFSHeader(sid=session.sid, seqno=header.seqno, cmd=header.cmd, status=TNFS_ERROR.SUCCESS)
-            self.send_response(session, response_header, response_data)
+            _U16_STRUCT.pack_into(self._tx_buf, _HDR_STRUCT.size, nread)
+            response_header = self.reply_header(session, header)
+            self.send_tx(session, response_header, start + nread)
             
         except Exception as e:
             logger.error(f"Readblock failed: {e}")
@@ -685,21 +1084,27 @@ class TNFSDaemon:
                 return None
 
             fd_index = data[0]
-            size = struct.unpack('<H', data[1:3])[0]
-            write_data = data[3:3+size]
+            size = _U16_STRUCT.unpack_from(data, 1)[0]
             
-            if fd_index >= MAX_FD_PER_CONN or session.fd[fd_index] is None:
+            fd = session.fd[fd_index] if fd_index < MAX_FD_PER_CONN else None
+            if fd is None:
                 logger.error("Invalid file descriptor")
                 self.send_error(session, header, TNFS_ERROR.EBADF)
                 return None
 
-            # Write data
-            bytes_written = os.write(session.fd[fd_index], write_data)
+            # Write data straight from the request, without slicing a copy
+            block = memoryview(data)[3:3 + size]
+            pos = session.fd_pos[fd_index]
+            if pos is not None:
+                bytes_written = _os_pwrite(fd, block, pos)
+                session.fd_pos[fd_index] = pos + bytes_written
+            else:
+                bytes_written = _os_write(fd, block)
+            self._dir_generation += 1
             
             # Send response with bytes written
-            response_data = struct.pack('<H', bytes_written)
-            response_header = TNFSHeader(sid=session.sid, seqno=header.seqno, cmd=header.cmd, status=TNFS_ERROR.SUCCESS)
-            self.send_response(session, response_header, response_data)
+            response_header = self.reply_header(session, header)
+            self.send_packed(session, response_header, _U16_STRUCT, bytes_written)
             
         except Exception as e:
             logger.error(f"Writeblock failed: {e}")
@@ -720,11 +1125,11 @@ class TNFSDaemon:
                 return None
 
             # Close file
-            os.close(session.fd[fd_index])
-            session.fd[fd_index] = None
+            _os_close(session.fd[fd_index])
+            session.release_fd(fd_index)
             
             # Send success response
-            response_header = TNFSHeader(sid=session.sid, seqno=header.seqno, cmd=header.cmd, status=TNFS_ERROR.SUCCESS)
+            response_header = self.reply_header(session, header)
             self.send_response(session, response_header)
             
         except Exception as e:
@@ -767,7 +1172,7 @@ class TNFSDaemon:
 
             fd_index = data[0]
             tnfs_whence = data[1]
-            offset = struct.unpack('<I', data[2:6])[0]
+            offset = _U32_STRUCT.unpack_from(data, 2)[0]
 
             if fd_index >= MAX_FD_PER_CONN or session.fd[fd_index] is None:
                 logger.error("Invalid file descriptor")
@@ -785,10 +1190,20 @@ class TNFSDaemon:
                 self.send_error(session, header, TNFS_ERROR.EINVAL)
                 return None
 
-            new_pos = os.lseek(session.fd[fd_index], int(offset), whence)
-            response_data = struct.pack('<I', int(new_pos))
-            response_header = TNFSHeader(sid=session.sid, seqno=header.seqno, cmd=header.cmd, status=TNFS_ERROR.SUCCESS)
-            self.send_response(session, response_header, response_data)
+            pos = session.fd_pos[fd_index]
+            if pos is None:
+                new_pos = os.lseek(session.fd[fd_index], offset, whence)
+            else:
+                # Only SEEK_END needs the file, for its size
+                if whence == os.SEEK_SET:
+                    new_pos = offset
+                elif whence == os.SEEK_CUR:
+                    new_pos = pos + offset
+                else:
+                    new_pos = os.fstat(session.fd[fd_index]).st_size + offset
+                session.fd_pos[fd_index] = new_pos
+            response_header = self.reply_header(session, header)
+            self.send_packed(session, response_header, _U32_STRUCT, int(new_pos))
 
         except Exception as e:
             logger.error(f"Seekfile failed: {e}")
@@ -802,10 +1217,12 @@ class TNFSDaemon:
                 self.send_error(session, header, TNFS_ERROR.EINVAL)
                 return None
             
-            path = data.rstrip(b'\x00').decode('utf-8', errors='ignore')
-            full_path = self.root_dir / path.lstrip('/')
+            path = _cpath(data)
+            full_path = self.resolve_path(path)
             os.unlink(full_path)
-            response_header = TNFSHeader(sid=session.sid, seqno=header.seqno, cmd=header.cmd, status=TNFS_ERROR.SUCCESS)
+            self.forget_path(full_path)
+            self._dir_generation += 1
+            response_header = self.reply_header(session, header)
             self.send_response(session, response_header)
         except FileNotFoundError:
             self.send_error(session, header, TNFS_ERROR.ENOENT)
@@ -832,14 +1249,17 @@ class TNFSDaemon:
                 logger.error("Invalid rename buffer")
                 self.send_error(session, header, TNFS_ERROR.EINVAL)
                 return None
-            from_path = data[:zero_pos].decode('utf-8', errors='ignore')
-            to_path = data[zero_pos + 1:-1].decode('utf-8', errors='ignore')
+            from_path = _cpath(data)
+            to_path = _cpath(data, zero_pos + 1)
 
-            full_from = self.root_dir / from_path.lstrip('/')
-            full_to = self.root_dir / to_path.lstrip('/')
+            full_from = self.resolve_path(from_path)
+            full_to = self.resolve_path(to_path)
 
             os.rename(full_from, full_to)
-            response_header = TNFSHeader(sid=session.sid, seqno=header.seqno, cmd=header.cmd, status=TNFS_ERROR.SUCCESS)
+            self._dir_generation += 1
+            self.forget_path(full_from)
+            self.forget_path(full_to)
+            response_header = self.reply_header(session, header)
             self.send_response(session, response_header)
         except FileNotFoundError:
             self.send_error(session, header, TNFS_ERROR.ENOENT)
@@ -857,15 +1277,18 @@ class TNFSDaemon:
                 self.send_error(session, header, TNFS_ERROR.EINVAL)
                 return None
 
-            path = data.rstrip(b'\x00').decode('utf-8', errors='ignore')
-            full_path = self.root_dir / path.lstrip('/')
+            path = _cpath(data)
+            full_path = self.resolve_path(path)
  
-            st = os.stat(full_path)
+            # Files the client has open are stat'ed through their descriptor
+            fd = session.fd_by_path.get(full_path)
+            st = os.fstat(fd) if fd is not None else os.stat(full_path)
  
             # Pack as per C implementation (TNFS_STAT_SIZE = 0x16 bytes)
             # <H H H I I I I => mode, uid, gid, size, atime, mtime, ctime
-            response_data = struct.pack(
-                '<HHHIIII',
+            response_header = self.reply_header(session, header)
+            self.send_packed(
+                session, response_header, _STAT_STRUCT,
                 int(st.st_mode) & 0xFFFF,
                 int(getattr(st, 'st_uid', 0)) & 0xFFFF,
                 int(getattr(st, 'st_gid', 0)) & 0xFFFF,
@@ -875,9 +1298,6 @@ class TNFSDaemon:
                 int(st.st_ctime) & 0xFFFFFFFF,
             )
  
-            response_header = TNFSHeader(sid=session.sid, seqno=header.seqno, cmd=header.cmd, status=TNFS_ERROR.SUCCESS)
-            self.send_response(session, response_header, response_data)
- 
         except FileNotFoundError:
             self.send_error(session, header, TNFS_ERROR.ENOENT)
         except PermissionError:
@@ -894,10 +1314,11 @@ class TNFSDaemon:
                 self.send_error(session, header, TNFS_ERROR.EINVAL)
                 return None
             
-            path = data.rstrip(b'\x00').decode('utf-8', errors='ignore')
-            full_path = self.root_dir / path.lstrip('/')
+            path = _cpath(data)
+            full_path = self.resolve_path(path)
             os.mkdir(full_path, 0o755)
-            response_header = TNFSHeader(sid=session.sid, seqno=header.seqno, cmd=header.cmd, status=TNFS_ERROR.SUCCESS)
+            self._dir_generation += 1
+            response_header = self.reply_header(session, header)
             self.send_response(session, response_header)
         except FileExistsError:
             self.send_error(session, header, TNFS_ERROR.EEXIST)
@@ -917,10 +1338,11 @@ class TNFSDaemon:
                 self.send_error(session, header, TNFS_ERROR.EINVAL)
                 return None
             
-            path = data.rstrip(b'\x00').decode('utf-8', errors='ignore')
-            full_path = self.root_dir / path.lstrip('/')
+            path = _cpath(data)
+            full_path = self.resolve_path(path)
             os.rmdir(full_path)
-            response_header = TNFSHeader(sid=session.sid, seqno=header.seqno, cmd=header.cmd, status=TNFS_ERROR.SUCCESS)
+            self._dir_generation += 1
+            response_header = self.reply_header(session, header)
             self.send_response(session, response_header)
         except FileNotFoundError:
             self.send_error(session, header, TNFS_ERROR.ENOENT)
@@ -938,7 +1360,7 @@ class TNFSDaemon:
                 return None
             
             handle_index = data[0]
-            pos = struct.unpack('<I', data[1:5])[0]
+            pos = _U32_STRUCT.unpack_from(data, 1)[0]
             if handle_index >= MAX_DHND_PER_CONN or session.dhandles[handle_index] is None:
                 logger.error("Invalid directory handle")
                 self.send_error(session, header, TNFS_ERROR.ENOENT)
@@ -949,7 +1371,7 @@ class TNFSDaemon:
             if pos > len(dir_handle.entries):
                 pos = len(dir_handle.entries)
             dir_handle.current_index = int(pos)
-            response_header = TNFSHeader(sid=session.sid, seqno=header.seqno, cmd=header.cmd, status=TNFS_ERROR.SUCCESS)
+            response_header = self.reply_header(session, header)
             self.send_response(session, response_header)
         except Exception as e:
             logger.error(f"Seekdir failed: {e}")
@@ -971,9 +1393,8 @@ class TNFSDaemon:
             
             dir_handle = session.dhandles[handle_index]
             pos = dir_handle.current_index
-            response_data = struct.pack('<I', int(pos))
-            response_header = TNFSHeader(sid=session.sid, seqno=header.seqno, cmd=header.cmd, status=TNFS_ERROR.SUCCESS)
-            self.send_response(session, response_header, response_data)
+            response_header = self.reply_header(session, header)
+            self.send_packed(session, response_header, _U32_STRUCT, int(pos))
         except Exception as e:
             logger.error(f"Telldir failed: {e}")
             self.send_error(session, header, TNFS_ERROR.EBADF)
@@ -988,32 +1409,37 @@ class TNFSDaemon:
             
             diropts = data[0]
             sortopts = data[1]
-            maxresults = struct.unpack('<H', data[2:4])[0]
+            maxresults = _U16_STRUCT.unpack_from(data, 2)[0]
             # pattern and dirpath
             rest = data[4:-1]
             zero = rest.find(b'\x00')
             if zero == -1:
                 pattern = None
-                dirpath = rest.decode('utf-8', errors='ignore')
+                dirpath = rest
             else:
-                pattern = rest[:zero].decode('utf-8', errors='ignore') or None
-                dirpath = rest[zero + 1:].decode('utf-8', errors='ignore')
+                pattern = rest[:zero] or None
+                dirpath = rest[zero + 1:]
 
-            full_path = self.root_dir / dirpath.lstrip('/')
-            if not full_path.exists() or not full_path.is_dir():
-                self.send_error(session, header, TNFS_ERROR.ENOENT)
-                return None
+            full_path = self.resolve_path(dirpath)
 
             # Acquire entries
-            all_entries = list(Path(full_path).iterdir())
+            try:
+                _, all_entries = self.snapshot_dir(full_path)
+            except NotADirectoryError:
+                self.send_error(session, header, TNFS_ERROR.ENOTDIR)
+                return None
+            except OSError:
+                self.send_error(session, header, TNFS_ERROR.ENOENT)
+                return None
             # Apply pattern (files only unless we choose otherwise) - simplified: apply to names
             if pattern:
-                filtered = [p for p in all_entries if fnmatch.fnmatch(p.name, pattern)]
+                match = _compile_glob(pattern)
+                filtered = [e for e in all_entries if match(e, _DIRENT_NAME_OFS, len(e) - 1)]
             else:
                 filtered = all_entries
 
-            # Sorting simplified: by name
-            filtered.sort(key=lambda p: p.name.lower())
+            # Sorting simplified: by name (into a new list, the snapshot is shared)
+            filtered = sorted(filtered, key=lambda e: _dirent_name(e).lower())
 
             # Apply maxresults as a cap on preloaded list length
             if maxresults:
@@ -1026,15 +1452,14 @@ class TNFSDaemon:
                 self.send_error(session, header, TNFS_ERROR.EMFILE)
                 return None
             
-            dir_handle = DirectoryHandle(str(full_path))
+            dir_handle = DirectoryHandle(full_path)
             dir_handle.entries = filtered
             dir_handle.entry_count = len(filtered)
             dir_handle.current_index = 0
             session.dhandles[handle_index] = dir_handle
 
-            reply = struct.pack('<B', handle_index) + struct.pack('<H', dir_handle.entry_count)
-            response_header = TNFSHeader(sid=session.sid, seqno=header.seqno, cmd=header.cmd, status=TNFS_ERROR.SUCCESS)
-            self.send_response(session, response_header, reply)
+            response_header = self.reply_header(session, header)
+            self.send_packed(session, response_header, _DIRHND_STRUCT, handle_index, dir_handle.entry_count)
         except FileNotFoundError:
             self.send_error(session, header, TNFS_ERROR.ENOENT)
         except Exception as e:
@@ -1057,60 +1482,73 @@ class TNFSDaemon:
                 return None
 
             dir_handle = session.dhandles[handle_index]
-            start_pos = dir_handle.current_index
-
-            # Prepare reply buffer
-            reply = bytearray()
-            reply.extend(b"\x00\x00")  # count, status
-            reply.extend(struct.pack('<H', start_pos & 0xFFFF))  # dpos (2 bytes)
-
-            count_sent = 0
-            total_size = 4
-
-            while dir_handle.current_index < len(dir_handle.entries):
-                if req_count != 0 and count_sent >= req_count:
-                    break
-                entry_path = dir_handle.entries[dir_handle.current_index]
-                # Compute entry fields
-                try:
-                    st = entry_path.stat()
-                except Exception:
-                    # Skip entries we cannot stat
-                    dir_handle.current_index += 1
-                    continue
-                flags = 0
-                if entry_path.is_dir():
-                    flags |= DIRENTRY_FLAGS.DIR
-                if entry_path.name.startswith('.'):
-                    flags |= DIRENTRY_FLAGS.HIDDEN
-                name_bytes = entry_path.name.encode('utf-8', errors='ignore') + b'\x00'
-                entry_size = 1 + 4 + 4 + 4 + len(name_bytes)
-                if total_size + entry_size > TNFS_MAX_PAYLOAD:
-                    break
-                # Append entry
-                reply.append(flags & 0xFF)
-                reply.extend(struct.pack('<I', int(st.st_size) if entry_path.is_file() else 0))
-                reply.extend(struct.pack('<I', int(st.st_mtime)))
-                reply.extend(struct.pack('<I', int(st.st_ctime)))
-                reply.extend(name_bytes)
-                count_sent += 1
-                total_size += entry_size
-                dir_handle.current_index += 1
+            # Handles from OPENDIR start before '.' and '..', which
+            # READDIRX does not return
+            start_pos = max(dir_handle.current_index, 0)
+            blob, offsets = dir_handle.packed_view()
+
+            # Entries sit back to back in one block, so the run that fits
+            # in the reply is found by bisecting the offsets and copied into
+            # the transmit buffer, after the reply header and the
+            # count/status/dpos fields, in a single slice assignment
+            start = _HDR_STRUCT.size + _DIRX_HDR_STRUCT.size
+            room = TNFS_MAX_PAYLOAD - _DIRX_HDR_STRUCT.size
+            total = len(offsets) - 1
+            end_index = total
+            if req_count != 0:
+                end_index = min(end_index, start_pos + req_count)
+            first = offsets[start_pos]
+            index = bisect_right(offsets, first + room, start_pos, end_index + 1) - 1
+            size = offsets[index] - first
+            buf = self._tx_buf
+            buf[start:start + size] = blob[first:first + size]
+            offset = start + size
+            count_sent = index - start_pos
+            dir_handle.current_index = index
 
             # EOF flag
-            if dir_handle.current_index >= len(dir_handle.entries):
-                reply[1] = reply[1] | TNFS_DIRSTATUS_EOF
-
-            reply[0] = count_sent & 0xFF
-
-            response_header = TNFSHeader(sid=session.sid, seqno=header.seqno, cmd=header.cmd, status=TNFS_ERROR.SUCCESS)
-            self.send_response(session, response_header, bytes(reply))
+            dirstatus = 0
+            if index >= total:
+                dirstatus |= TNFS_DIRSTATUS_EOF
+
+            _DIRX_HDR_STRUCT.pack_into(buf, _HDR_STRUCT.size, count_sent & 0xFF, dirstatus, start_pos & 0xFFFF)
+
+            # The whole batch goes out as one datagram with a single sendto.
+            # A gathered sendmsg straight from the entry block would not save
+            # the copy: the session keeps the sent buffer as its contiguous
+            # retransmit copy, and sendmsg is missing on Windows
+            response_header = self.reply_header(session, header)
+            self.send_tx(session, response_header, offset)
         except Exception as e:
             logger.error(f"Readdirx failed: {e}")
             self.send_error(session, header, TNFS_ERROR.EBADF)
 
-    def handle_packet(self, data: bytes, client_addr: Tuple[str, int]):
-        """Handle incoming TNFS packet"""
+    # Directory and file command handlers, keyed by plain int command ID and
+    # built once with the class; called with the daemon as first argument
+    _DISPATCH = {
+        TNFS_CMD.OPENDIR.value: handle_opendir,
+        TNFS_CMD.READDIR.value: handle_readdir,
+        TNFS_CMD.CLOSEDIR.value: handle_closedir,
+        TNFS_CMD.MKDIR.value: handle_mkdir,
+        TNFS_CMD.RMDIR.value: handle_rmdir,
+        TNFS_CMD.TELLDIR.value: handle_telldir,
+        TNFS_CMD.SEEKDIR.value: handle_seekdir,
+        TNFS_CMD.OPENDIRX.value: handle_opendirx,
+        TNFS_CMD.READDIRX.value: handle_readdirx,
+        TNFS_CMD.OPENFILE.value: handle_openfile,
+        TNFS_CMD.READBLOCK.value: handle_readblock,
+        TNFS_CMD.WRITEBLOCK.value: handle_writeblock,
+        TNFS_CMD.CLOSEFILE.value: handle_closefile,
+        TNFS_CMD.STATFILE.value: handle_statfile,
+        TNFS_CMD.OPENFILE_OLD.value: handle_openfile_old,
+        TNFS_CMD.SEEKFILE.value: handle_seekfile,
+        TNFS_CMD.UNLINKFILE.value: handle_unlinkfile,
+        TNFS_CMD.CHMODFILE.value: handle_chmodfile,
+        TNFS_CMD.RENAMEFILE.value: handle_renamefile,
+    }
+
+    def handle_packet(self, data, client_addr: Tuple[str, int]):
+        """Handle incoming TNFS packet (bytes or a view of the receive buffer)"""
         try:
             if len(data) < TNFS_HEADERSZ:
                 logger.warning("Packet too short")
@@ -1118,19 +1556,30 @@ class TNFSDaemon:
 
             # Parse header
             header = TNFSHeader.unpack(data)
-            header.ipaddr = struct.unpack('<I', socket.inet_aton(client_addr[0]))[0]
-            header.port = client_addr[1]
 
-            payload = data[TNFS_HEADERSZ:]
+            # Find session (sid 0, sent before MOUNT, is never assigned)
+            session = self.sessions.get(header.sid)
+            if session:
+                session.last_contact = time.time()
+                # A repeated seqno means our reply was lost, resend it
+                # rather than running the command twice
+                if (session.lastmsgsz and header.seqno == session.lastseqno
+                        and session.lastmsg[3] == header.cmd):
+                    self.resend_last(session)
+                    return
 
-            # Find session
-            session = None
-            if header.sid != 0:
-                session = self.find_session_by_sid(header.sid)
-                if session:
-                    session.last_contact = time.time()
+            # Handlers get their own copy, the receive buffer is reused
+            payload = bytes(data[TNFS_HEADERSZ:])
+
+            # Directory and file commands resolve with one table lookup
+            handler = self._DISPATCH.get(header.cmd)
+            if handler is not None:
+                if not session:
+                    logger.warning(f"No session for {'directory' if header.cmd & 0xF0 == CLASS.DIRECTORY else 'file'} command")
+                    return
+                handler(self, header, session, payload)
+                return
 
-            # Handle command
             cmd_class = header.cmd & 0xF0
 
             if cmd_class == CLASS.SESSION:
@@ -1142,61 +1591,12 @@ class TNFSDaemon:
                     logger.warning(f"Unknown session command: {header.cmd}")
                     self.send_error(session, header, TNFS_ERROR.ENOSYS)
 
-            elif cmd_class == CLASS.DIRECTORY:
-                if not session:
-                    logger.warning("No session for directory command")
-                    return
-
-                if header.cmd == TNFS_CMD.OPENDIR:
-                    self.handle_opendir(header, session, payload)
-                elif header.cmd == TNFS_CMD.READDIR:
-                    self.handle_readdir(header, session, payload)
-                elif header.cmd == TNFS_CMD.CLOSEDIR:
-                    self.handle_closedir(header, session, payload)
-                elif header.cmd == TNFS_CMD.MKDIR:
-                    self.handle_mkdir(header, session, payload)
-                elif header.cmd == TNFS_CMD.RMDIR:
-                    self.handle_rmdir(header, session, payload)
-                elif header.cmd == TNFS_CMD.TELLDIR:
-                    self.handle_telldir(header, session, payload)
-                elif header.cmd == TNFS_CMD.SEEKDIR:
-                    self.handle_seekdir(header, session, payload)
-                elif header.cmd == TNFS_CMD.OPENDIRX:
-                    self.handle_opendirx(header, session, payload)
-                elif header.cmd == TNFS_CMD.READDIRX:
-                    self.handle_readdirx(header, session, payload)
-                else:
-                    logger.warning(f"Unsupported directory command: {header.cmd}")
-                    self.send_error(session, header, TNFS_ERROR.ENOSYS)
-
-            elif cmd_class == CLASS.FILE:
+            elif cmd_class == CLASS.DIRECTORY or cmd_class == CLASS.FILE:
                 if not session:
-                    logger.warning("No session for file command")
+                    logger.warning(f"No session for {'directory' if cmd_class == CLASS.DIRECTORY else 'file'} command")
                     return
-
-                if header.cmd == TNFS_CMD.OPENFILE:
-                    self.handle_openfile(header, session, payload)
-                elif header.cmd == TNFS_CMD.READBLOCK:
-                    self.handle_readblock(header, session, payload)
-                elif header.cmd == TNFS_CMD.WRITEBLOCK:
-                    self.handle_writeblock(header, session, payload)
-                elif header.cmd == TNFS_CMD.CLOSEFILE:
-                    self.handle_closefile(header, session, payload)
-                elif header.cmd == TNFS_CMD.STATFILE:
-                    self.handle_statfile(header, session, payload)
-                elif header.cmd == TNFS_CMD.OPENFILE_OLD:
-                    self.handle_openfile_old(header, session, payload)
-                elif header.cmd == TNFS_CMD.SEEKFILE:
-                    self.handle_seekfile(header, session, payload)
-                elif header.cmd == TNFS_CMD.UNLINKFILE:
-                    self.handle_unlinkfile(header, session, payload)
-                elif header.cmd == TNFS_CMD.CHMODFILE:
-                    self.handle_chmodfile(header, session, payload)
-                elif header.cmd == TNFS_CMD.RENAMEFILE:
-                    self.handle_renamefile(header, session, payload)
-                else:
-                    logger.warning(f"Unsupported file command: {header.cmd}")
-                    self.send_error(session, header, TNFS_ERROR.ENOSYS)
+                logger.warning(f"Unsupported {'directory' if cmd_class == CLASS.DIRECTORY else 'file'} command: {header.cmd}")
+                self.send_error(session, header, TNFS_ERROR.ENOSYS)
             else:
                 logger.warning(f"Unknown command class: {cmd_class}")
                 self.send_error(session, header, TNFS_ERROR.ENOSYS)
@@ -1204,6 +1604,24 @@ class TNFSDaemon:
         except Exception as e:
             logger.error(f"Error handling packet: {e}")
     
+    def drain_udp(self):
+        """Handle up to UDP_BATCH queued datagrams without going back to select()"""
+        recvfrom_into = self.udp_socket.recvfrom_into
+        rx_buf = self._rx_buf
+        rx_view = self._rx_view
+        # Without MSG_DONTWAIT a second receive could block, so only the
+        # datagram select() reported is read
+        batch = UDP_BATCH if _MSG_DONTWAIT else 1
+        for _ in range(batch):
+            try:
+                nbytes, client_addr = recvfrom_into(rx_buf, 0, _MSG_DONTWAIT)
+            except (BlockingIOError, InterruptedError):
+                break
+            except Exception as e:
+                logger.error(f"UDP receive error: {e}")
+                break
+            self.handle_packet(rx_view[:nbytes], client_addr)
+    
     def run(self):
         """Main daemon loop"""
         self.setup_sockets()
@@ -1222,12 +1640,8 @@ class TNFSDaemon:
                 
                 for sock in readable:
                     if sock == self.udp_socket:
-                        # Handle UDP packet
-                        try:
-                            data, client_addr = self.udp_socket.recvfrom(MAXMSGSZ)
-                            self.handle_packet(data, client_addr)
-                        except Exception as e:
-                            logger.error(f"UDP receive error: {e}")
+                        # Handle UDP packets
+                        self.drain_udp()
                     
                     elif sock == self.tcp_socket:
                         # Handle TCP connection